@@ -0,0 +1,41 @@
+import time
+import numpy as np
+from extmodules import shm_cfg
+
+# 采集路径拷贝开销基准：
+# 旧路径：cam.read() 每帧分配新数组，再 frame_array[:] = img 拷贝进共享内存
+# 新路径：cam.retrieve(image=slot) 直接解码到共享内存槽位
+# 这里只测量旧路径额外多出的 "分配 + 拷贝"，即新路径每秒节省的开销
+
+def main():
+    shape = (shm_cfg.HEIGHT, shm_cfg.WIDTH, shm_cfg.CHANNELS)
+    frame_bytes = shm_cfg.FRAME_BYTES
+    rounds = 300
+
+    slot = np.zeros(shape, dtype=np.uint8)
+    src = np.random.randint(0, 256, shape, dtype=np.uint8)
+
+    # 旧路径多出的部分：新分配一帧 (首次写入触发缺页) + 拷贝到槽位
+    start = time.perf_counter()
+    for _ in range(rounds):
+        img = np.empty(shape, dtype=np.uint8)
+        img[:] = src
+        slot[:] = img
+    legacy = (time.perf_counter() - start) / rounds
+
+    # 新路径：解码器直接写入槽位 (以一次写入模拟)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        slot[:] = src
+    direct = (time.perf_counter() - start) / rounds
+
+    saved = legacy - direct
+    print(f"分辨率: {shm_cfg.WIDTH}x{shm_cfg.HEIGHT}x{shm_cfg.CHANNELS} @ {shm_cfg.FPS} fps")
+    print(f"单帧大小: {frame_bytes / 1e6:.2f} MB")
+    print(f"旧路径: {legacy * 1000:.3f} ms/帧 | 新路径: {direct * 1000:.3f} ms/帧")
+    print(f"每帧节省: {saved * 1000:.3f} ms, 每秒节省 CPU 时间: {saved * shm_cfg.FPS * 1000:.1f} ms")
+    print(f"每秒少分配: {frame_bytes * shm_cfg.FPS / 1e6:.0f} MB, 少拷贝: {frame_bytes * shm_cfg.FPS / 1e6:.0f} MB "
+          f"(内存带宽合计 {2 * frame_bytes * shm_cfg.FPS / 1e6:.0f} MB/s)")
+
+if __name__ == "__main__":
+    main()
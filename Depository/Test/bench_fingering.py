@@ -0,0 +1,69 @@
+import time
+import numpy as np
+from extmodules import fingering_corrector
+from extmodules import result_segment
+
+# check_fingering_batch 基准：
+# 1. 与逐个调用 check_fingering 的结果逐条比对，必须完全一致
+# 2. 统计每秒可判定的按键数，目标 TARGET_KPS
+
+TARGET_KPS = 1_000_000
+N = 100_000
+REPEAT = 5      # 计时取 REPEAT 次中最快的一次，减少调度抖动
+
+def random_hands(fc, rng, n):
+    # 模拟历史记录：每帧 0~2 只手，指尖散布在键盘附近
+    hands = np.zeros((n, 2), dtype=result_segment.HAND_DTYPE)
+    counts = rng.integers(0, 3, n)
+    hands['label'][:, 0] = rng.integers(0, 2, n)
+    hands['label'][:, 1] = 1.0 - hands['label'][:, 0]
+    centre = np.float32(list(fc.key_map.values())).mean(axis=0) / (fc.WIDTH, fc.HEIGHT)
+    hands['landmarks'][..., :2] = centre + rng.normal(0, 0.08, (n, 2, 21, 2))
+    return hands, counts
+
+def main():
+    rng = np.random.default_rng(0)
+    fc = fingering_corrector.FingeringCorrector(connect=False)
+    fc.ak_coord = {'q': (600, 500), 'p': (1320, 500), 'z': (660, 660), 'm': (1140, 660)}
+    fc._generate_key_map()
+
+    keys = rng.choice(list(fc.finger_map) + [' ', 'ENTER'], N).tolist()
+    hands, counts = random_hands(fc, rng, N)
+
+    # --- 一致性检查 (抽样 5000 条) ---
+    landmarks = fc.pack_landmarks(hands, counts)
+    status, actual, expected = fc.check_fingering_batch(keys, landmarks)
+    mismatch = 0
+    for i in range(5000):
+        hands_data = fc._to_hands(hands[i, :counts[i]])
+        verdict, detail = fc.check_fingering(keys[i], hands_data)
+        if verdict != fingering_corrector.VERDICTS[status[i]]:
+            mismatch += 1
+        elif verdict == "Wrong" and detail != (fc.finger_names[actual[i]].split('_')[1], fc.finger_names[expected[i]].split('_')[1]):
+            mismatch += 1
+    print(f"一致性: 5000 条中 {mismatch} 条不一致")
+
+    # --- 逐个调用 ---
+    hands_list = [fc._to_hands(hands[i, :counts[i]]) for i in range(5000)]
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for i in range(5000):
+            fc.check_fingering(keys[i], hands_list[i])
+        best = min(best, time.perf_counter() - start)
+    scalar_kps = 5000 / best
+
+    # --- 批量调用 ---
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fc.check_fingering_batch(keys, landmarks)
+        best = min(best, time.perf_counter() - start)
+    batch_kps = N / best
+
+    print(f"逐个调用: {scalar_kps:,.0f} 键/秒")
+    print(f"批量调用: {batch_kps:,.0f} 键/秒 (x{batch_kps / scalar_kps:.0f}, {REPEAT} 次取最快)")
+    print(f"目标 {TARGET_KPS:,} 键/秒: {'达成' if batch_kps >= TARGET_KPS else '未达成'}")
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,12 @@ import numpy as np
 import time
 from multiprocessing import shared_memory
 from extmodules import shm_cfg
+from extmodules import frame_ring
+
+# 撕裂帧 (torn read) 统计:
+# 读取过程中若该槽位的序号发生变化，说明读到一半被写入覆盖。
+# 将 shm_cfg.FRAME_SLOTS 设为 1 即为旧的单缓冲行为 (改动前)，设为 3 为三缓冲 (改动后)，
+# 两次运行的撕裂率即可对比。
 
 def main():
     print("正在尝试连接共享内存...")
@@ -17,16 +23,18 @@ def main():
             time.sleep(1)
 
     shm_buf = shm_frame.buf
-    frame_shape = (shm_cfg.HEIGHT, shm_cfg.WIDTH, shm_cfg.CHANNELS)
-    shared_img = np.ndarray(frame_shape, dtype=np.uint8, buffer=shm_buf, offset=1)
+    # 分辨率、帧率等由摄像头进程写入帧段头部，这里直接读取，无需与 shm_cfg 保持一致
+    while frame_ring.geometry(shm_buf) is None:
+        time.sleep(0.1)
+    ring = frame_ring.FrameRing(shm_buf)
 
-    print("开始读取视频流... 将执行 100 秒进行分析...")
+    print(f"帧几何: {ring.width}x{ring.height}x{ring.channels} @ {ring.fps} fps, 行跨度 {ring.stride} 字节")
+    print(f"开始读取视频流 (槽位数: {ring.slots})... 将执行 100 秒进行分析...")
 
     # --- 统计变量初始化 ---
     start_time = time.time()
     duration = 100  # 运行秒数
-    count_idle = 0
-    count_writing = 0
+    count_empty = 0
     # --------------------
 
     try:
@@ -37,27 +45,21 @@ def main():
                 print("\n--- 时间到，停止采样 ---")
                 break
 
+            if shm_buf[0] == shm_cfg.FLAG_EXIT:
+                print("\n收到 EXIT 标志")
+                break
+
             # --- 统计逻辑 ---
-            # 在做任何判断前，先记录当前状态
-            current_status = shm_buf[0]
-            
-            if current_status == shm_cfg.FLAG_WRITING:
-                count_writing += 1
-                # 如果正在写入，跳过读取，直接进入下一次循环
-                # 注意：这里不需要 sleep，因为我们要尽可能快地采样状态
-                continue 
-            else:
-                count_idle += 1
+            # 每次 read 内部的重试都会计入 ring.torn
+            current_frame = ring.read(lambda frame: frame.copy(), retries=1)
+            if current_frame is None:
+                count_empty += 1
+                continue
             # ----------------
 
-            # 4. 读取并显示
-            current_frame = shared_img.copy() 
-            
             # 打印当前进度
-            print(f"\r进度: {elapsed_time:.1f}/{duration}s | Buffer: {hex(id(shm_buf))} | 状态: {current_status}", end="")
+            print(f"\r进度: {elapsed_time:.1f}/{duration}s | 成功: {ring.reads} | 撕裂: {ring.torn}", end="")
 
-            # display_img = cv2.cvtColor(current_frame, cv2.COLOR_RGB2BGR)
-            # cv2.imshow("Reader Process", display_img)
             cv2.imshow("Reader Process", current_frame)
 
             if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -68,23 +70,25 @@ def main():
         print(f"\n发生错误: {e}")
     finally:
         # --- 输出分析结果 ---
-        total_samples = count_idle + count_writing
-        print("\n\n====== 占空比分析报告 ======")
+        total_samples = ring.reads + ring.torn
+        print("\n\n====== 撕裂帧分析报告 ======")
+        print(f"槽位数: {ring.slots}")
         if total_samples > 0:
-            print(f"总采样次数: {total_samples}")
-            print(f"IDLE (可读) 次数: {count_idle} \t占比: {count_idle/total_samples*100:.2f}%")
-            print(f"WRITING (写入中) 次数: {count_writing} \t占比: {count_writing/total_samples*100:.2f}%")
+            print(f"总读取次数: {total_samples} (另有 {count_empty - ring.torn} 次无帧可读)")
+            print(f"完整帧次数: {ring.reads} \t占比: {ring.reads/total_samples*100:.2f}%")
+            print(f"撕裂帧次数: {ring.torn} \t占比: {ring.torn/total_samples*100:.2f}%")
             
-            if count_writing / total_samples > 0.5:
-                print("警告：写入状态占比过高，读取进程可能经常被阻塞。")
+            if ring.torn / total_samples > 0.01:
+                print("警告：撕裂率过高，请增加 FRAME_SLOTS。")
             else:
-                print("状态：读取流畅。")
+                print("状态：读取完整。")
         else:
             print("未采集到样本。")
         print("============================")
         
+        ring.close()
         shm_frame.close()
         cv2.destroyAllWindows()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,51 @@
+import numpy as np
+import time
+from multiprocessing import shared_memory
+from extmodules import shm_cfg
+from extmodules import landmark_ring
+
+# 关键点流录制：以无损 (lossless) 方式订阅检测器的关键点环形缓冲区，
+# 每条记录按顺序保存到 .npy 文件。订阅者只维护自己的读游标，
+# 检测器不会因为录制变慢而阻塞；落后超过一圈时丢失的记录计入 overruns。
+
+DURATION = 30   # 录制秒数
+OUTPUT = "landmarks.npy"
+
+def main():
+    print("正在尝试连接关键点共享内存...")
+
+    shm_history = None
+    while shm_history is None:
+        try:
+            shm_history = shared_memory.SharedMemory(name=shm_cfg.SHM_HISTORY_ID)
+            print(f"成功连接到共享内存: {shm_cfg.SHM_HISTORY_ID}")
+        except FileNotFoundError:
+            print("未找到共享内存，请先运行 YiTian.py... (1秒后重试)")
+            time.sleep(1)
+
+    ring = landmark_ring.LandmarkRing(shm_history.buf)
+    sub = ring.subscribe(landmark_ring.SUB_LOSSLESS)
+    chunks = []
+    start_time = time.time()
+
+    try:
+        while time.time() - start_time < DURATION:
+            records = sub.poll()
+            if len(records):
+                chunks.append(records)
+            print(f"\r已录制: {sub.received} 条 | 丢失 (overrun): {sub.overruns}", end="")
+            time.sleep(0.05)    # 故意低频轮询，环形缓冲区足以容纳期间的记录
+    except KeyboardInterrupt:
+        print("\n用户手动停止")
+    finally:
+        if chunks:
+            records = np.concatenate(chunks)
+            np.save(OUTPUT, records)
+            gaps = np.count_nonzero(np.diff(records['record_no']) != 1)
+            print(f"\n已保存 {len(records)} 条记录到 {OUTPUT}，记录编号不连续处: {gaps}")
+        del sub
+        ring.close()
+        shm_history.close()
+
+if __name__ == "__main__":
+    main()
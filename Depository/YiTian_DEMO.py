@@ -45,10 +45,64 @@ class HandDetector:
         self.results = self.hands.process(img_rgb)
         return self.results
     
+class OverlayLayer:
+    # 預先渲染的疊加圖層 (同 extmodules/overlay.py,示範程式保持獨立可直接執行):
+    # 分別畫在黑、白底上,兩者之差即每個像素的透明度,每幀只需混合一次
+    def __init__(self, sparse_coverage=0.5):
+        self.sparse_coverage = sparse_coverage
+        self.key = None
+        self.shape = None
+        self.box = None
+        self.index = None
+        self.color = None
+        self.keep = None
+
+    def update(self, shape, key, draw):
+        shape = tuple(shape[:2])
+        if key == self.key and shape == self.shape:
+            return False
+        self.key = key
+        self.shape = shape
+
+        black = np.zeros((*shape, 3), dtype=np.uint8)
+        white = np.full((*shape, 3), 255, dtype=np.uint8)
+        draw(black)
+        draw(white)
+        keep = white - black
+        ys, xs = np.nonzero((keep != 255).any(axis=2) | black.any(axis=2))
+        if len(xs) == 0:
+            self.box = None
+            return True
+
+        x0, y0, x1, y1 = int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1
+        self.box = (x0, y0, x1, y1)
+        self.color = black[y0:y1, x0:x1]
+        self.keep = keep[y0:y1, x0:x1]
+        if len(xs) < self.sparse_coverage * (x1 - x0) * (y1 - y0):
+            self.index = (ys - y0, xs - x0)
+            self.color = self.color[self.index]
+            self.keep = self.keep[self.index]
+        else:
+            self.index = None
+        return True
+
+    def composite(self, img):
+        if self.box is None:
+            return img
+        x0, y0, x1, y1 = self.box
+        roi = img[y0:y1, x0:x1]
+        if self.index is None:
+            cv2.add(cv2.multiply(roi, self.keep, scale=1 / 255), self.color, dst=roi)
+        else:
+            roi[self.index] = cv2.add(cv2.multiply(roi[self.index], self.keep, scale=1 / 255), self.color)
+        return img
+
 class TypingCorrector:
     def __init__(self):
         self.key_layout = ["qwertyuiop", "asdfghjkl", "zxcvbnm"]
         self.key_map = {}
+        self.key_map_version = 0
+        self.keyboard_layer = OverlayLayer()
         self.finger_map = self._generate_finger_map()
         self.fingertip_indices = {
             "RIGHT_THUMB": 4, "RIGHT_INDEX": 8, "RIGHT_MIDDLE": 12, "RIGHT_RING": 16, "RIGHT_PINKY": 20,
@@ -90,6 +144,7 @@ class TypingCorrector:
             
             for i, char in enumerate(row_str):
                 self.key_map[char] = tuple(transformed_pts[i][0].astype(int))
+        self.key_map_version += 1
 
         print("四點校準成功,鍵盤映射已優化!")
         return True
@@ -110,9 +165,14 @@ class TypingCorrector:
 
     def draw_keyboard(self, img):
         if not self.key_map: return
+        # 字母只在鍵盤映射更新時繪製一次,每幀僅混合預先渲染的圖層
+        self.keyboard_layer.update(img.shape, self.key_map_version, self._render_keyboard)
+        self.keyboard_layer.composite(img)
+
+    def _render_keyboard(self, img):
         for char, (x, y) in self.key_map.items():
             # 移除背景圓圈,只保留字母
-            cv2.putText(img, char.upper(), (x - 10, y + 10), 
+            cv2.putText(img, char.upper(), (int(x) - 10, int(y) + 10), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
 
     def check_fingering(self, typed_key, hands_landmarks, handedness, frame_width, frame_height):
@@ -289,6 +349,7 @@ class TypingTrainerApp:
         
         self.follow_mode = settings.get('follow_mode', False)
         self.article_manager = ArticleManager() if self.follow_mode else None
+        self.article_layer = OverlayLayer()
         
         if self.follow_mode:
             self.article_manager.load_article("初級", 0)
@@ -413,7 +474,14 @@ class TypingTrainerApp:
                                cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), (0, 0, 0), 2, 8, 0.8)
 
     def _draw_article_display(self, image):
-        """繪製跟打文章顯示區域"""
+        """繪製跟打文章顯示區域 (只在文章或進度變化時重新渲染圖層)"""
+        am = self.article_manager
+        key = (am.current_level, am.current_index, am.current_article, am.current_position, am.errors, am.start_time)
+        self.article_layer.update(image.shape, key, self._render_article_display)
+        self.article_layer.composite(image)
+
+    def _render_article_display(self, image):
+        """渲染跟打文章區域,統計資料隨按鍵更新"""
         article = self.article_manager.current_article
         pos = self.article_manager.current_position
         
@@ -17,7 +17,8 @@ packages = ["ttkbootstrap",
             "numpy", 
             "pynput", 
             "customtkinter", 
-            "pywinstyles"]
+            "pywinstyles", 
+            "psutil"]
 
 success = []
 exists = []
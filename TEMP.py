@@ -7,12 +7,17 @@ Licensed under the GNU GPL v3.0 License.
 '''
 
 from extmodules import shm_cfg
+from extmodules import frame_ring
+from extmodules import doorbell
 from extmodules import keyboard_listener
 from extmodules import fingering_corrector
+from extmodules import mailbox
+from extmodules import overlay
 import multiprocessing
 from multiprocessing import shared_memory
 import sys
 import os
+import queue
 import cv2
 import subprocess
 import numpy as np
@@ -20,11 +25,14 @@ import time
 # import customtkinter as ctk
 # import tkinter as tk
 
-def camera(num, stop_event, ready_event, ui_queue):
+POSE_WAIT_NS = 100_000_000  # 初判之后最多等待 100 ms 的复检结果或真实帧用于复判
+
+def camera(num, stop_event, ready_event):
     cam = None
     shm_frame = None
-    local_key_map = None
-    local_finger_pos = None # <--- 新增变量：存储手指位置
+    ring = None
+    bell = None
+    last_publish_ns = 0
     try:
         cam = cv2.VideoCapture(num, cv2.CAP_DSHOW)
         if not cam.isOpened():
@@ -39,85 +47,58 @@ def camera(num, stop_event, ready_event, ui_queue):
 
         real_res = [int(cam.get(cv2.CAP_PROP_FRAME_WIDTH)), 
                     int(cam.get(cv2.CAP_PROP_FRAME_HEIGHT)), 
-                    int(cam.get(cv2.CAP_PROP_FPS))]
+                    int(cam.get(cv2.CAP_PROP_FPS)) or res[2]]
         
         print(f"Process: Camera opened. Resolution: {real_res}")
         
+        # 按实际协商的分辨率分配共享内存，几何信息写入帧段头部供读者读取
+        slots = frame_ring.history_slots(real_res[2])
+        size = frame_ring.segment_size(real_res[0], real_res[1], slots=slots)
         try:
-            shm_frame = shared_memory.SharedMemory(create=True, size=shm_cfg.FRAME_SIZE, name=shm_cfg.SHM_FRAME_ID)
+            shm_frame = shared_memory.SharedMemory(create=True, size=size, name=shm_cfg.SHM_FRAME_ID)
             print("Process: Shared Memory Frame created.")
-            ready_event.set()
         except FileExistsError:
             print("Process: Shared Memory Frame already exists. Cleaning up...")
             try:
-                with shared_memory.SharedMemory(name=shm_cfg.SHM_FRAME_ID) as temp_shm:
-                    temp_shm.unlink()
+                temp_shm = shared_memory.SharedMemory(name=shm_cfg.SHM_FRAME_ID)
+                temp_shm.close()
+                temp_shm.unlink()
             except:
                 pass
-            shm_frame = shared_memory.SharedMemory(create=True, size=shm_cfg.FRAME_SIZE, name=shm_cfg.SHM_FRAME_ID)
-            ready_event.set()
+            shm_frame = shared_memory.SharedMemory(create=True, size=size, name=shm_cfg.SHM_FRAME_ID)
 
         shm_buf = shm_frame.buf
         shm_buf[0] = shm_cfg.FLAG_IDLE
-        frame_array = np.ndarray((res[1], res[0], shm_cfg.CHANNELS), dtype=np.uint8, buffer=shm_buf, offset=1)
+        ring = frame_ring.FrameRing(shm_buf, *real_res, slots=slots)
+        bell = doorbell.Doorbell()
+        ready_event.set()
 
         print("Process: Camera loop started.")
         while not stop_event.is_set():
-            ret, img = cam.read()
+            if not cam.grab():
+                continue
+            timestamp_ns = time.perf_counter_ns()
+            if shm_cfg.FRAME_ACK and not ring.ready() and timestamp_ns - last_publish_ns < shm_cfg.FRAME_ACK_TIMEOUT_NS:
+                # 读者尚未取走之前的帧，跳过解码和拷贝
+                ring.skip()
+                continue
+
+            # 直接解码到共享内存槽位，不再经过中间帧缓冲
+            # 注意：写入共享内存的通常是不翻转的原始图像，或者根据 HandDetector 的需求决定
+            slot = ring.acquire()
+            ret, img = cam.retrieve(image=slot)
             if not ret:
-                continue 
-            
-            # 1. 检查是否有新数据传过来
-            try:
-                # 使用 while 循环把队列里的积压数据读完，只保留最新的，防止画面延迟
-                while not ui_queue.empty():
-                    msg_type, data = ui_queue.get_nowait()
-                    if msg_type == 'key_map':
-                        local_key_map = data
-                        print("Camera: Received Key Map data.")
-                    elif msg_type == 'finger_pos': # <--- 新增消息类型
-                        local_finger_pos = data
-            except:
-                pass
-
-            # 2. 准备显示画面
-            img_show = img.copy() 
-
-            # 3. 绘制手指当前位置 (红色圆点 + 光圈)
-            if local_finger_pos:
-                # 画实心红点
-                cv2.circle(img_show, local_finger_pos, 6, (0, 0, 255), -1)
-                # 画空心圆圈，增加可见度
-                cv2.circle(img_show, local_finger_pos, 10, (0, 0, 255), 2)
-
-            # 4. 绘制键盘映射 (如果有)
-            if local_key_map:
-                for char, (x, y) in local_key_map.items():
-                    draw_x = x
-                    draw_y = y
-                    cv2.circle(img_show, (draw_x, draw_y), 4, (0, 255, 255), -1)
-                    cv2.putText(img_show, char.upper(), (draw_x - 10, draw_y - 10), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
-
-            cv2.imshow("YiTian Camera Feed", img_show)
-            cv2.waitKey(1)
-            
-            try:
-                shm_buf[0] = shm_cfg.FLAG_WRITING
-                # 注意：写入共享内存的通常是不翻转的原始图像，或者根据 HandDetector 的需求决定
-                # 这里我们写入原始图像 img
-                frame_array[:] = img
-            except:
-                pass
-            finally:
-                shm_buf[0] = shm_cfg.FLAG_IDLE
+                ring.abort()
+                continue
+            if img is not slot:
+                slot[:] = img
+            ring.publish(timestamp_ns)
+            last_publish_ns = timestamp_ns
+            bell.ring()
 
     except Exception as e:
         print(f"Camera Error: {e}")
     finally:
-        # --- 新增：销毁窗口 ---
-        cv2.destroyAllWindows()
-        # --------------------
         if cam is not None:
             cam.release()
             print("Process: Camera released.")
@@ -125,42 +106,186 @@ def camera(num, stop_event, ready_event, ui_queue):
         if shm_frame is not None:
             try:
                 shm_buf[0] = shm_cfg.FLAG_EXIT
+                if bell is not None:
+                    bell.ring()
+                    bell.close()
                 print("Process: Sent EXIT flag to HandDector.")
                 time.sleep(0.1)
+                if ring is not None:
+                    copied, skipped = ring.counts()
+                    print(f"Process: Frames copied: {copied}, skipped: {skipped}, dropped: {ring.dropped()}.")
+                    ring.close()
                 shm_frame.close()
                 shm_frame.unlink()
                 print("Process: Shared Memory cleared.")
             except Exception as e:
                 print(f"Error: Cleaning up shared memory failed: {e}")
 
+def draw_key_map(canvas, key_map):
+    for char, (x, y) in key_map.items():
+        cv2.circle(canvas, (x, y), 4, (0, 255, 255), -1)
+        cv2.putText(canvas, char.upper(), (x - 10, y - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
+
+def display(stop_event, ui_queue, scale=shm_cfg.PREVIEW_SCALE, fps=shm_cfg.PREVIEW_FPS):
+    # 预览窗口独立于采集循环：按自己的刷新率读取最新帧，显示卡顿不再拖慢帧发布
+    shm_frame = None
+    shm_mailbox = None
+    ring = None
+    mb = None
+    frame_no = 0
+    local_key_map = None
+    local_finger_pos = None # 存储手指位置 (预览坐标)
+    key_map_version = 0
+    keyboard_layer = overlay.OverlayLayer()   # 键位标注只在键位图版本变化时重绘
+    finger_gen = -1
+    period = 1.0 / fps
+    try:
+        shm_frame = shared_memory.SharedMemory(name=shm_cfg.SHM_FRAME_ID)
+        ring = frame_ring.FrameRing(shm_frame.buf)
+        # 主进程在启动摄像头前创建邮箱段
+        shm_mailbox = shared_memory.SharedMemory(name=shm_cfg.SHM_MAILBOX_ID)
+        mb = mailbox.Mailbox(shm_mailbox.buf)
+
+        # 在槽位内直接缩小，不拷贝整帧；不确认帧号，以免影响摄像头的跳帧判断
+        if scale == 1.0:
+            shrink = lambda frame: frame.copy()
+        else:
+            shrink = lambda frame: cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        print(f"Process: Preview started ({ring.width * scale:.0f}x{ring.height * scale:.0f} @ {fps} fps).")
+        while not stop_event.is_set() and shm_frame.buf[0] != shm_cfg.FLAG_EXIT:
+            t0 = time.perf_counter()
+            img_show = ring.read(shrink, after=frame_no, ack=False)
+            if img_show is None:
+                cv2.waitKey(max(int(period * 1000), 1))
+                continue
+            frame_no = ring.frame_no
+
+            # 1. 从邮箱读取最新状态：世代号不变则无需读取
+            if mb.generation(mailbox.MB_FINGER) != finger_gen:
+                finger_gen, pos = mb.get_finger()
+                local_finger_pos = (int(pos[0] * scale), int(pos[1] * scale)) if pos else None
+            # 键位图只在版本号变化时才从控制队列取出；消息尚未送达则不等待，下一帧再取
+            version = mb.get_key_map_version()
+            while key_map_version < version:
+                try:
+                    msg_type, data = ui_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if msg_type == 'key_map':
+                    key_map_version, key_map = data
+                    local_key_map = {char: (int(x * scale), int(y * scale)) for char, (x, y) in key_map.items()}
+                    print("Preview: Received Key Map data.")
+
+            # 2. 叠加预先渲染的键盘映射 (如果有)，每帧只做一次区域混合
+            if local_key_map:
+                keyboard_layer.update(img_show.shape, key_map_version, lambda canvas: draw_key_map(canvas, local_key_map))
+                keyboard_layer.composite(img_show)
+
+            # 3. 绘制手指当前位置 (红色圆点 + 光圈)
+            if local_finger_pos:
+                # 画实心红点
+                cv2.circle(img_show, local_finger_pos, 6, (0, 0, 255), -1)
+                # 画空心圆圈，增加可见度
+                cv2.circle(img_show, local_finger_pos, 10, (0, 0, 255), 2)
+
+            # 4. 显示最近一次指法判定
+            _, key, verdict, verdict_ns = mb.get_verdict()
+            if key and ring.timestamp_ns - verdict_ns < shm_cfg.VERDICT_SHOW_NS:
+                status = fingering_corrector.VERDICTS[verdict]
+                color = (0, 255, 0) if status == "Correct" else (0, 0, 255) if status == "Wrong" else (0, 255, 255)
+                cv2.putText(img_show, f"{key.upper()}: {status}", (20, 40),
+                            cv2.FONT_HERSHEY_SIMPLEX, 1.0, color, 2)
+
+            cv2.imshow("YiTian Camera Feed", img_show)
+            # 等待剩余的刷新周期
+            cv2.waitKey(max(int((period - (time.perf_counter() - t0)) * 1000), 1))
+
+    except Exception as e:
+        print(f"Preview Error: {e}")
+    finally:
+        cv2.destroyAllWindows()
+        if ring is not None:
+            ring.close()
+        if mb is not None:
+            mb.close()
+        if shm_frame is not None:
+            shm_frame.close()
+        if shm_mailbox is not None:
+            shm_mailbox.close()
+        print("Process: Preview closed.")
+
 class YiTian:
     def __init__(self):
         self.stop_event = multiprocessing.Event()
         self.ready_event = multiprocessing.Event()
-        self.ui_queue = multiprocessing.Queue() # <--- 新增队列
+        # 高频状态 (手指位置、判定) 走共享内存邮箱，只保留最新值；队列仅用于键位图等少量控制消息
+        self.ui_queue = multiprocessing.Queue(shm_cfg.UI_QUEUE_SIZE)
+        self.shm_mailbox = None
+        self.mailbox = None
+        self.key_map_version = 0
+        self.key_map_msg = None     # 尚未入队的最新键位图
         self.cam_proc = None
+        self.view_proc = None
         self.hd_proc = None
         self.kbl = None
         self.fc = None
 
+    def start_mailbox(self):
+        try:
+            self.shm_mailbox = shared_memory.SharedMemory(create=True, size=shm_cfg.MAILBOX_SIZE, name=shm_cfg.SHM_MAILBOX_ID)
+        except FileExistsError:
+            print("Process: Shared Memory Mailbox already exists. Cleaning up...")
+            temp_shm = shared_memory.SharedMemory(name=shm_cfg.SHM_MAILBOX_ID)
+            temp_shm.close()
+            temp_shm.unlink()
+            self.shm_mailbox = shared_memory.SharedMemory(create=True, size=shm_cfg.MAILBOX_SIZE, name=shm_cfg.SHM_MAILBOX_ID)
+        self.shm_mailbox.buf[:shm_cfg.MAILBOX_SIZE] = bytes(shm_cfg.MAILBOX_SIZE)
+        self.mailbox = mailbox.Mailbox(self.shm_mailbox.buf)
+
+    def send_key_map(self):
+        self.key_map_version += 1
+        self.key_map_msg = ('key_map', (self.key_map_version, dict(self.fc.key_map)))
+        self.flush_key_map()
+
+    def flush_key_map(self):
+        # 先入队再发布版本号，摄像头看到新版本时消息已在队列中。
+        # 队列已满 (预览进程卡住或已退出) 时不阻塞：保留最新一份，主循环下一轮再试，未送出的旧键位图直接被替换
+        if self.key_map_msg is None:
+            return
+        try:
+            self.ui_queue.put_nowait(self.key_map_msg)
+        except queue.Full:
+            return
+        self.mailbox.set_key_map_version(self.key_map_msg[1][0])
+        self.key_map_msg = None
+
     def start_cam(self, num):
         print("Process: Starting Camera...")
-        # 传递 self.ui_queue
-        self.cam_proc = multiprocessing.Process(target=camera, args=(num, self.stop_event, self.ready_event, self.ui_queue))
+        self.cam_proc = multiprocessing.Process(target=camera, args=(num, self.stop_event, self.ready_event))
         self.cam_proc.start()
 
         if not self.ready_event.wait(timeout=15):
             print("Error: Camera initialization timed out.")
             return False
         return True
+
+    def start_view(self):
+        # 预览进程需要帧段已创建，在摄像头就绪后启动
+        print("Process: Starting Preview...")
+        self.view_proc = multiprocessing.Process(target=display, args=(self.stop_event, self.ui_queue))
+        self.view_proc.start()
+        return True
         
-    def start_hd(self):
+    def start_hd(self, workers=shm_cfg.DETECTOR_WORKERS, split=shm_cfg.DETECTOR_SPLIT):
         print("Process: Starting Hand Detector...")
         try:
             python_exec = sys.executable
             hd_path = os.path.join(os.path.dirname(__file__), "extmodules", "hand_detector.py")
             # 使用 CREATE_NEW_CONSOLE 让它在单独窗口运行，方便调试，发布时可去掉
-            self.hd_proc = subprocess.Popen([python_exec, hd_path], creationflags=subprocess.CREATE_NEW_CONSOLE)
+            args = [python_exec, hd_path, "--workers", str(workers)] + (["--split"] if split else [])
+            self.hd_proc = subprocess.Popen(args, creationflags=subprocess.CREATE_NEW_CONSOLE)
             time.sleep(3) # 等待 HD 进程初始化共享内存
             print(f"Process: Hand Detector started with PID: {self.hd_proc.pid}")
             return True
@@ -178,6 +303,21 @@ class YiTian:
             print(f"Error: Module initialization failed: {e}")
             return False
     
+    def _report(self, event, status, detail, revised=False):
+        key = event.key
+        # 复判只更正仍在显示的那条结论；之后的按键已发布判定时只打印，不覆盖较新的结论
+        latest = not revised or self.mailbox.get_verdict()[3] == event.timestamp_ns
+        if status != "No rule" and latest:
+            self.mailbox.set_verdict(key, fingering_corrector.VERDICTS.index(status), event.timestamp_ns)
+        note = " (revised)" if revised else ""
+        if status == "Correct":
+            print(f"✅ Key: '{key}' | Finger: {detail}{note}")
+        elif status == "Wrong":
+            print(f"❌ Key: '{key}' | Error: Used {detail}{note}")
+        elif status == "Unknown":
+            print(f"⚠️ Key: '{key}' | Hand not detected or too far{note}")
+        # "No rule" (如空格、回车) 忽略不打印
+
     def _get_calibration_finger(self, hands_data):
         """
         辅助函数：获取用于校准的手指坐标（默认使用检测到的第一只手的食指）
@@ -191,7 +331,9 @@ class YiTian:
 
     def run(self):
         # 1. 启动所有子系统
+        self.start_mailbox()
         if not self.start_cam(1): return
+        if not self.start_view(): return
         if not self.start_hd(): return
         if not self.init_modules(): return
 
@@ -204,24 +346,28 @@ class YiTian:
 
         # 标记是否已经发送过 key_map，避免重复发送
         key_map_sent = False 
+        pending = []    # 已初判、等待复判的按键: (事件, 复检请求编号 (False 表示无需复检), 初判结论, 详情)
 
         try:
             while not self.stop_event.is_set():
                 # 2. 获取输入数据
-                key = self.kbl.get_key()
+                # 一次取出本轮所有按键事件，按时间顺序逐个处理 (忽略松开与长按重复)
+                events = [e for e in self.kbl.drain() if e.pressed and not e.repeat]
+                if events:
+                    self.fc.notify_key(events[-1].timestamp_ns)   # 按键时强制检测器重新推理
                 hands = self.fc.read_shm_data()
+                self.flush_key_map()
 
                 # --- 新增：发送手指位置给 UI ---
                 # 获取用于校准的手指（食指）
                 calib_finger = self._get_calibration_finger(hands)
                 
                 if calib_finger:
-                    # 提取 (x, y) 并发送
-                    pos_tuple = (calib_finger['x'], calib_finger['y'])
-                    self.ui_queue.put(('finger_pos', pos_tuple))
+                    # 提取 (x, y) 写入邮箱，覆盖旧值而不排队
+                    self.mailbox.set_finger((int(calib_finger['x']), int(calib_finger['y'])))
                 else:
-                    # 如果没检测到手，发送 None 以便 UI 清除光标
-                    self.ui_queue.put(('finger_pos', None))
+                    # 如果没检测到手，写入空位置以便 UI 清除光标
+                    self.mailbox.set_finger(None)
 
                 # 3. 校准模式
                 if not self.fc.is_calibrated:
@@ -231,13 +377,13 @@ class YiTian:
                         print(f">> Calibration: Please press '{target.upper()}' with your finger on the key.")
                         last_calib_idx = self.fc.ak_idx
 
-                    if key:
+                    for key in (e.key for e in events):
                         finger_pos = self._get_calibration_finger(hands)
                         if finger_pos:
                             if self.fc.key_map_calibration(key, finger_pos):
                                 # 校准成功！发送数据给 Camera 进程
                                 print("Main: Sending Key Map to Camera...")
-                                self.ui_queue.put(('key_map', self.fc.key_map))
+                                self.send_key_map()
                                 key_map_sent = True
                         else:
                             print("Warning: Key pressed but no hand detected!")
@@ -246,23 +392,41 @@ class YiTian:
                 else:
                     # 确保 key_map 被发送过 (防止重启校准后没更新)
                     if not key_map_sent and self.fc.key_map:
-                         self.ui_queue.put(('key_map', self.fc.key_map))
+                         self.send_key_map()
                          key_map_sent = True
 
                     if last_calib_idx != -2:
                         print("\n>> System Ready. Start Typing!\n")
                         last_calib_idx = -2 # 标记为已完成
 
-                    if key:
-                        status, detail = self.fc.check_fingering(key, hands)
-                        
-                        if status == "Correct":
-                            print(f"✅ Key: '{key}' | Finger: {detail}")
-                        elif status == "Wrong":
-                            print(f"❌ Key: '{key}' | Error: Used {detail}")
-                        elif status == "Unknown":
-                            print(f"⚠️ Key: '{key}' | Hand not detected or too far")
-                        # "No rule" (如空格、回车) 忽略不打印
+                    # 按键到达时立即判定：已有按键时刻之后的帧则插值，否则用跟踪器把最新指尖外推到按键时刻；
+                    # 同时排队复检，高精度结果或真实帧到达后再复判，结论变化时更正
+                    for event in events:
+                        hands_at = self.fc.read_shm_data_at(event.timestamp_ns, predict=True) or hands
+                        status, detail = self.fc.check_fingering(event.key, hands_at)
+                        self._report(event, status, detail)
+                        if status != "No rule":
+                            refine_req = self.fc.request_refine(event.key, event.timestamp_ns) or False
+                            pending.append((event, refine_req, status, detail))
+
+                    now = time.perf_counter_ns()
+                    still_pending = []
+                    for event, refine_req, status, detail in pending:
+                        waited = now - event.timestamp_ns
+                        refined = self.fc.read_refined(refine_req)
+                        if refined is None and waited < POSE_WAIT_NS:
+                            still_pending.append((event, refine_req, status, detail))   # 复检尚未完成
+                            continue
+                        # 无复检结果时改用按键时刻前后的真实帧插值
+                        hands_at = refined or self.fc.read_shm_data_at(event.timestamp_ns)
+                        if hands_at is None:
+                            if waited < POSE_WAIT_NS:
+                                still_pending.append((event, refine_req, status, detail))
+                            continue    # 超时则保留初判
+                        final, final_detail = self.fc.check_fingering(event.key, hands_at)
+                        if (final, final_detail) != (status, detail):
+                            self._report(event, final, final_detail, revised=True)
+                    pending = still_pending
 
                 # 避免 CPU 占用过高
                 time.sleep(0.01)
@@ -292,6 +456,19 @@ class YiTian:
                 self.cam_proc.join()
             self.cam_proc = None
 
+        if self.view_proc is not None:
+            self.view_proc.join(timeout=1)
+            if self.view_proc.is_alive():
+                self.view_proc.terminate()
+                self.view_proc.join()
+            self.view_proc = None
+
+        if self.shm_mailbox is not None:
+            self.mailbox.close()
+            self.shm_mailbox.close()
+            self.shm_mailbox.unlink()
+            self.shm_mailbox = None
+
         if self.hd_proc is not None:
             self.hd_proc.terminate()
             self.hd_proc = None
@@ -7,6 +7,8 @@ Licensed under the GNU GPL v3.0 License.
 '''
 
 from extmodules import shm_cfg
+from extmodules import frame_ring
+from extmodules import doorbell
 from extmodules import keyboard_listener
 from extmodules import fingering_corrector
 from extmodules import stabilizer
@@ -26,6 +28,9 @@ import tkinter as tk
 def camera(num, stop_event, ready_event):
     cam = None
     shm_frame = None
+    ring = None
+    bell = None
+    last_publish_ns = 0
     try:
         cam = cv2.VideoCapture(num, cv2.CAP_DSHOW)
         if not cam.isOpened():
@@ -40,38 +45,51 @@ def camera(num, stop_event, ready_event):
 
         real_res = [int(cam.get(cv2.CAP_PROP_FRAME_WIDTH)), 
                     int(cam.get(cv2.CAP_PROP_FRAME_HEIGHT)), 
-                    int(cam.get(cv2.CAP_PROP_FPS))]
+                    int(cam.get(cv2.CAP_PROP_FPS)) or res[2]]
         if real_res != res:
-            raise ValueError(f"Resolution Setting Unavailable: Expected {res}, but got {real_res}")
+            # Consumers read the geometry from the frame segment header, any mode works
+            print(f"Process: Camera opened. Requested {res}, negotiated {real_res}.")
         else:
             print(f"Process: Camera opened.")
         
+        slots = frame_ring.history_slots(real_res[2])
+        size = frame_ring.segment_size(real_res[0], real_res[1], slots=slots)
         try:
-            shm_frame = shared_memory.SharedMemory(create=True, size=shm_cfg.FRAME_SIZE, name=shm_cfg.SHM_FRAME_ID)
+            shm_frame = shared_memory.SharedMemory(create=True, size=size, name=shm_cfg.SHM_FRAME_ID)
             print("Process: Shared Memory Frame created.")
-            ready_event.set()
         except FileExistsError:
             print("Process: Shared Memory Frame already exists. Cleaning up...")
-            with shared_memory.SharedMemory(name=shm_cfg.SHM_FRAME_ID) as temp_shm:
-                temp_shm.unlink()
-            shm_frame = shared_memory.SharedMemory(create=True, size=shm_cfg.FRAME_SIZE, name=shm_cfg.SHM_FRAME_ID)
+            temp_shm = shared_memory.SharedMemory(name=shm_cfg.SHM_FRAME_ID)
+            temp_shm.close()
+            temp_shm.unlink()
+            shm_frame = shared_memory.SharedMemory(create=True, size=size, name=shm_cfg.SHM_FRAME_ID)
 
         shm_buf = shm_frame.buf
         shm_buf[0] = shm_cfg.FLAG_IDLE
-        frame_array = np.ndarray((res[1], res[0], shm_cfg.CHANNELS), dtype=np.uint8, buffer=shm_buf, offset=1)
+        ring = frame_ring.FrameRing(shm_buf, *real_res, slots=slots)
+        bell = doorbell.Doorbell()
+        ready_event.set()
 
         while not stop_event.is_set():
-            ret, img = cam.read()
-            if not ret:
+            if not cam.grab():
                 raise IOError("Frame can not be read")
+            timestamp_ns = time.perf_counter_ns()
+            if shm_cfg.FRAME_ACK and not ring.ready() and timestamp_ns - last_publish_ns < shm_cfg.FRAME_ACK_TIMEOUT_NS:
+                # No reader has taken the previous frames yet, skip the decode and copy
+                ring.skip()
+                continue
             
-            try:
-                shm_buf[0] = shm_cfg.FLAG_WRITING
-                frame_array[:] = img
-            except:
-                pass
-            finally:
-                shm_buf[0] = shm_cfg.FLAG_IDLE
+            # Decode straight into the ring slot, no intermediate frame buffer
+            slot = ring.acquire()
+            ret, img = cam.retrieve(image=slot)
+            if not ret:
+                ring.abort()
+                raise IOError("Frame can not be decoded")
+            if img is not slot:
+                slot[:] = img
+            ring.publish(timestamp_ns)
+            last_publish_ns = timestamp_ns
+            bell.ring()
 
     except Exception as e:
         print(f"Error: {e}")
@@ -83,9 +101,16 @@ def camera(num, stop_event, ready_event):
         if shm_frame is not None:
             try:
                 shm_buf[0] = shm_cfg.FLAG_EXIT
+                if bell is not None:
+                    bell.ring()
+                    bell.close()
                 print("Process: Sent EXIT flag to HandDector.")
                 time.sleep(0.1)
 
+                if ring is not None:
+                    copied, skipped = ring.counts()
+                    print(f"Process: Frames copied: {copied}, skipped: {skipped}, dropped: {ring.dropped()}.")
+                    ring.close()
                 shm_frame.close()
                 shm_frame.unlink()
                 shm_frame = None
@@ -111,12 +136,13 @@ class YiTian:
             print("Error: Camera initialization timed out.")
             return False
         
-    def start_hd(self):
+    def start_hd(self, workers=shm_cfg.DETECTOR_WORKERS, split=shm_cfg.DETECTOR_SPLIT):
         print("Process: Starting Hand Detector.")
         try:
             python_exec = sys.executable
             hd_path = os.path.join(os.path.dirname(__file__), "extmodules", "hand_detector.py")
-            self.hd_proc = subprocess.Popen([python_exec, hd_path], creationflags=subprocess.CREATE_NEW_CONSOLE)
+            args = [python_exec, hd_path, "--workers", str(workers)] + (["--split"] if split else [])
+            self.hd_proc = subprocess.Popen(args, creationflags=subprocess.CREATE_NEW_CONSOLE)
             time.sleep(5)
             print(f"Process: Hand Detector started with PID: {self.hd_proc.pid}")
         except Exception as e:
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+'''
+YiTian - Doorbell Module
+
+Copyright (c) 2025 Zhang Zhewei (Liyue-Wei)
+Licensed under the GNU GPL v3.0 License. 
+'''
+
+import socket
+try:
+    import shm_cfg
+except ModuleNotFoundError:
+    from extmodules import shm_cfg
+
+class Doorbell:
+    '''
+    Cross-process wakeup over a loopback UDP socket.
+
+    The hand detector is started with subprocess.Popen, so it shares no
+    multiprocessing primitive with camera(). Datagrams queue up in the socket
+    buffer, so a ring sent before wait() is never lost.
+    '''
+    def __init__(self, listen=False, port=shm_cfg.DOORBELL_PORT):
+        self.addr = ("127.0.0.1", port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if listen:
+            self.sock.bind(self.addr)
+        else:
+            self.sock.setblocking(False)
+
+    def ring(self):
+        try:
+            self.sock.sendto(b"\x01", self.addr)
+        except OSError:
+            pass    # No listener yet or buffer full, the reader still polls on timeout
+
+    def wait(self, timeout=shm_cfg.DOORBELL_TIMEOUT):
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.recv(16)
+        except OSError:
+            return False    # Timed out, or nothing pending with timeout=0
+        
+        # Coalesce rings that piled up while the reader was busy
+        self.sock.setblocking(False)
+        try:
+            while True:
+                self.sock.recv(16)
+        except OSError:
+            pass
+        return True
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
@@ -7,17 +7,34 @@ Licensed under the GNU GPL v3.0 License.
 '''
 
 from multiprocessing import shared_memory
+import itertools
 from extmodules import shm_cfg
+from extmodules import shm_control
+from extmodules import frame_ring
+from extmodules import landmark_ring
+from extmodules import result_segment
+from extmodules import tracker
 import numpy as np
 import cv2
 
+CORRECT_RADIUS = 30     # px, expected fingertip this close to the key is always correct
+REACH_RADIUS = 80       # px, nearest fingertip further than this means the hand is too far
+
+# Verdict codes returned by check_fingering_batch(), VERDICTS maps them to check_fingering() statuses
+VERDICT_NO_RULE, VERDICT_UNMAPPED, VERDICT_CORRECT, VERDICT_WRONG, VERDICT_UNKNOWN = range(5)
+VERDICTS = ("No rule", None, "Correct", "Wrong", "Unknown")
+
 class FingeringCorrector:
-    def __init__(self):
+    def __init__(self, connect=True):
         self.shm_frame = None
         self.shm_result = None
+        self.results = None
+        self.shm_control = None
+        self.shm_history = None
+        self.control = None
+        self.history = None
         self.WIDTH = shm_cfg.WIDTH
         self.HEIGHT = shm_cfg.HEIGHT
-        self.float_arr_len = (shm_cfg.RESULT_SIZE - 4) // 4
         self.key_layout = ["qwertyuiop", "asdfghjkl", "zxcvbnm"]
         self.key_map = {}
         self.finger_map = {
@@ -44,45 +61,129 @@ class FingeringCorrector:
         self.ak_idx = 0
         self.is_calibrated = False
 
+        # Precompiled tables for check_fingering_batch(), hand slot 0 = Left, 1 = Right
+        self.finger_names = list(self.fingertip_indices)
+        self._tip_idx = np.array(list(self.fingertip_indices.values()))
+        self._tip_hand = np.array([0 if f.startswith("LEFT") else 1 for f in self.finger_names])
+        self._tip_flat = self._tip_hand * 21 + self._tip_idx     # into landmarks flattened to [n, 42, 2]
+        self._key_index = {char: i for i, char in enumerate(self.finger_map)}
+        self._key_finger = np.array([self.finger_names.index(f) for f in self.finger_map.values()])
+        self._key_pos = np.full((len(self.finger_map), 2), np.nan)
+
+        if not connect:
+            return      # Offline use (replay, analytics), no detector running
+
+        # Pixel coordinates follow the mode the camera actually negotiated
+        try:
+            shm_frame = shared_memory.SharedMemory(name=shm_cfg.SHM_FRAME_ID)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Shared Memory unavaliable: {shm_cfg.SHM_FRAME_ID}")
+        try:
+            geometry = frame_ring.geometry(shm_frame.buf)   # plain ints, no view kept on the buffer
+        finally:
+            shm_frame.close()
+        if geometry is not None:
+            self.WIDTH, self.HEIGHT = geometry.width, geometry.height
+
         try:
             self.shm_result = shared_memory.SharedMemory(name=shm_cfg.SHM_RESULT_ID)
+            self.results = result_segment.ResultSegment(self.shm_result.buf)
             print("Process: Shared Memory Result connected.")
         except FileNotFoundError:
             raise FileNotFoundError(f"Shared Memory unavaliable: {shm_cfg.SHM_RESULT_ID}")      
 
+        try:
+            self.shm_control = shared_memory.SharedMemory(name=shm_cfg.SHM_CONTROL_ID)
+            self.control = shm_control.ControlBlock(self.shm_control.buf)
+            print("Process: Shared Memory Control connected.")
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Shared Memory unavaliable: {shm_cfg.SHM_CONTROL_ID}")
+
+        try:
+            self.shm_history = shared_memory.SharedMemory(name=shm_cfg.SHM_HISTORY_ID)
+            self.history = landmark_ring.LandmarkRing(self.shm_history.buf)
+            print("Process: Shared Memory History connected.")
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Shared Memory unavaliable: {shm_cfg.SHM_HISTORY_ID}")
+
+    def read_result(self):
+        # Consistent copy of the latest result: (header, hands) with header['result_no'],
+        # ['frame_no'], ['capture_ns'] and ['finish_ns'] to tell a fresh result from a stale one.
+        # header None without a result, or if the segment stayed torn before the first good copy
+        result = self.results.read() if self.results is not None else None
+        if result is None:
+            return None, np.empty((0,), dtype=result_segment.HAND_DTYPE)
+        return result
+
+    def read_landmarks(self):
+        # Structured copy (label, score, landmarks[21, 3]) of the latest result
+        return self.read_result()[1]
+
+    def subscribe(self, mode=landmark_ring.SUB_LOSSLESS):
+        # Own cursor over the detector's landmark stream, see landmark_ring.Subscriber
+        return self.history.subscribe(mode)
+
     def read_shm_data(self):
-        if self.shm_result is None:
-            return []
+        # Dict form kept for callers that index hand['landmarks'][i]['x']
+        return self._to_hands(self.read_landmarks())
+
+    def read_shm_data_at(self, timestamp_ns, predict=False):
+        # Hands at timestamp_ns, interpolated between the two nearest history records.
+        # While no frame captured at or after timestamp_ns has been processed this returns
+        # None, or with predict=True the newest pose with fingertips extrapolated by the tracker.
+        if self.history is None:
+            return None
         
-        try:
-            shm_buf = self.shm_result.buf
-            count = shm_buf[0]
-            if count == 0:
-                return []
-            
-            data_array = np.ndarray((self.float_arr_len,), dtype=np.float32, buffer=shm_buf, offset=4)
-            hands = []
-            for i in range(count):
-                interval = i * 65
-                label = "Left" if (data_array[interval] == 1.0) else "Right"
-                lm_flat = data_array[interval + 2 : interval + 65]
-                landmarks = []
-                for j in range(0, 63, 3):
-                    landmarks.append({
-                        'x': int(lm_flat[j] * self.WIDTH),
-                        'y': int(lm_flat[j+1] * self.HEIGHT),
-                        'z': lm_flat[j+2]
-                    })
-                
-                hands.append({
-                    'label': label,
-                    'landmarks': landmarks
-                })
-                
-            return hands
+        records = self.history.snapshot()
+        if len(records) == 0:
+            return None
+        if records['timestamp_ns'][-1] < timestamp_ns:
+            return self._predict(records[-1], timestamp_ns) if predict else None
         
-        except Exception as e:
-            raise(f"Error: Unexpected error occurred: {e}")
+        idx = np.searchsorted(records['timestamp_ns'], timestamp_ns)
+        after = records[idx]
+        hands_a = after['hands'][:after['count']]
+        if idx == 0:
+            return self._to_hands(hands_a)
+
+        before = records[idx - 1]
+        hands_b = before['hands'][:before['count']]
+        span = after['timestamp_ns'] - before['timestamp_ns']
+        w = (timestamp_ns - before['timestamp_ns']) / span if span > 0 else 1.0
+
+        # Interpolate only when both records hold the same hands, otherwise take the nearer one
+        if sorted(hands_b['label']) != sorted(hands_a['label']):
+            return self._to_hands(hands_a if w >= 0.5 else hands_b)
+
+        hands = hands_b.copy()
+        for hand in hands:
+            match = hands_a[hands_a['label'] == hand['label']][0]
+            hand['landmarks'] += w * (match['landmarks'] - hand['landmarks'])
+        return self._to_hands(hands)
+
+    def _predict(self, record, timestamp_ns):
+        hands = record['hands'][:record['count']].copy()
+        dt = (timestamp_ns - record['timestamp_ns']) / 1e9
+        tips = record['tips'][:, :2] + record['tips'][:, 2:] * dt
+        n = len(tracker.TIP_INDICES)
+        for hand in hands:
+            slot = 0 if hand['label'] == 1.0 else n
+            hand_tips = tips[slot : slot + n]
+            tracked = ~np.isnan(hand_tips[:, 0])
+            hand['landmarks'][np.array(tracker.TIP_INDICES)[tracked], :2] = hand_tips[tracked]
+        return self._to_hands(hands)
+
+    def _to_hands(self, hands_arr):
+        pixels = (hands_arr['landmarks'][..., :2] * (self.WIDTH, self.HEIGHT)).astype(int).tolist()
+        hands = []
+        for hand, xy in zip(hands_arr, pixels):
+            landmarks = [{'x': x, 'y': y, 'z': z} for (x, y), z in zip(xy, hand['landmarks'][:, 2])]
+            hands.append({
+                'label': "Left" if (hand['label'] == 1.0) else "Right",
+                'landmarks': landmarks
+            })
+            
+        return hands
 
     def key_map_calibration(self, pressed_key, finger_pos):
         if not finger_pos:
@@ -102,6 +203,7 @@ class FingeringCorrector:
                 success = self._generate_key_map()
                 if success:
                     self.is_calibrated = True
+                    self._publish_roi()
                     print("Process: Calibration successed. Keyboard map generated.")
                     return True
                 else:
@@ -115,6 +217,10 @@ class FingeringCorrector:
         self.ak_coord = {}
         self.is_calibrated = False
         self.key_map = {}
+        self._compile_key_map()
+        if self.control is not None:
+            self.control.set_roi(None)
+            self.control.set_split(None)
 
     def _generate_key_map(self):
         try:
@@ -146,12 +252,75 @@ class FingeringCorrector:
                 for i, char in enumerate(row_str):
                     self.key_map[char] = tuple(transformed_pts[i][0].astype(int))
             
+            self._compile_key_map()
             return True
             
         except Exception as e:
             print(f"Process: Unexpected error occurred: {e}")
             return False
 
+    def _compile_key_map(self):
+        self._key_pos[:] = [self.key_map.get(char, (np.nan, np.nan)) for char in self.finger_map]
+
+    def _key_pitch(self):
+        return np.hypot(*np.subtract(self.key_map['p'], self.key_map['q'])) / 9
+
+    def _publish_roi(self):
+        # Keyboard bounding box plus a margin for palms and hovering fingers
+        pts = np.float32(list(self.key_map.values()))
+        pitch = self._key_pitch()
+        margin = pitch * shm_cfg.ROI_MARGIN_KEYS
+        x0, y0 = np.maximum(pts.min(axis=0) - margin, 0).astype(int)
+        x1, y1 = np.minimum(pts.max(axis=0) + margin, (self.WIDTH, self.HEIGHT)).astype(int)
+        if self.control is None:
+            return
+        self.control.set_roi((x0, y0, x1, y1))
+        print(f"Process: Keyboard ROI published: {(x0, y0, x1, y1)}")
+
+        # Split line between the hands: mean of the t|y, g|h and b|n midpoints
+        split_x = int(np.mean([(self.key_map[a][0] + self.key_map[b][0]) / 2 for a, b in (('t', 'y'), ('g', 'h'), ('b', 'n'))]))
+        overlap = int(pitch * shm_cfg.SPLIT_OVERLAP_KEYS)
+        left_first = self.key_map['q'][0] < self.key_map['p'][0]
+        self.control.set_split(split_x, overlap, left_first)
+        print(f"Process: Keyboard split published: x={split_x}, overlap={overlap}")
+
+    def set_stabilizer(self, mode, **params):
+        # Runtime change of the detector's smoothing stage, mode None / 'ema' / 'one_euro'
+        self.control.set_filter(mode, **params)
+
+    def notify_key(self, timestamp_ns):
+        # Keystrokes always get a fresh inference, past the detector's motion gate
+        if self.control is not None:
+            self.control.notify_key(timestamp_ns)
+
+    def request_refine(self, typed_key, timestamp_ns):
+        # Queue a model_complexity=1 pass around typed_key at the press time, up to
+        # shm_control.REFINE_QUEUE presses can be in flight. Returns the request id for
+        # read_refined(), None when there is nothing to refine.
+        if not shm_cfg.REFINE_ON_KEY or self.control is None or typed_key not in self.key_map:
+            return None
+        
+        half = self._key_pitch() * shm_cfg.REFINE_CROP_KEYS
+        x, y = self.key_map[typed_key]
+        x0, y0 = int(max(x - half, 0)), int(max(y - half, 0))
+        x1, y1 = int(min(x + half, self.WIDTH)), int(min(y + half, self.HEIGHT))
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return self.control.set_refine(timestamp_ns, (x0, y0, x1, y1))
+
+    def read_refined(self, request):
+        # Refined hands for request, None while it is pending, False if it can not be served
+        if not request:
+            return False
+        
+        reply = self.control.get_refined(request)
+        if reply is None:
+            return None
+        hands = reply[2]
+        if hands is None:
+            return False
+        return self._to_hands(hands.view(result_segment.HAND_DTYPE).reshape(-1))
+
     def check_fingering(self, typed_key, hands_data):
         if not typed_key or typed_key not in self.finger_map: 
             return "No rule", None
@@ -167,7 +336,7 @@ class FingeringCorrector:
             if hand['label'] == expected_hand_label:
                 lm = hand['landmarks'][expected_finger_idx]
                 dist = np.hypot(lm['x'] - target_key_pos[0], lm['y'] - target_key_pos[1])
-                if dist < 30: 
+                if dist < CORRECT_RADIUS: 
                     return "Correct", correct_finger_name
 
         min_dist = float('inf')
@@ -184,10 +353,75 @@ class FingeringCorrector:
                     min_dist = dist
                     actual_finger_name = fname
 
-        if min_dist > 80:
+        if min_dist > REACH_RADIUS:
             return "Unknown", "Hand too far"
             
         if actual_finger_name == correct_finger_name:
             return "Correct", correct_finger_name
         
-        return "Wrong", (actual_finger_name.split('_')[1], correct_finger_name.split('_')[1])
\ No newline at end of file
+        return "Wrong", (actual_finger_name.split('_')[1], correct_finger_name.split('_')[1])
+
+    def pack_landmarks(self, hands_arr, counts=None):
+        # Structured hands ([n, 2] HAND_DTYPE, e.g. history records) -> [n, 2, 21, 2] pixel array
+        # for check_fingering_batch(). Missing hands are NaN, pixels truncated like read_shm_data().
+        # Two hands with the same label (a mislabelled frame) share a slot: the higher-score one is
+        # kept, where check_fingering() would search both.
+        hands_arr = np.atleast_2d(hands_arr)
+        n = len(hands_arr)
+        if counts is None:
+            counts = np.full(n, hands_arr.shape[1])
+        
+        out = np.full((n, 2, 21, 2), np.nan, dtype=np.float32)
+        rows, cols = np.nonzero(np.arange(hands_arr.shape[1]) < np.asarray(counts)[:, None])
+        hands = hands_arr[rows, cols]
+        slot = np.where(hands['label'] == 1.0, 0, 1)
+
+        order = np.lexsort((hands['score'], slot, rows))
+        rows, slot, hands = rows[order], slot[order], hands[order]
+        best = np.ones(len(rows), dtype=bool)       # last, i.e. highest score, of each (row, slot) run
+        best[:-1] = (rows[1:] != rows[:-1]) | (slot[1:] != slot[:-1])
+        rows, slot, hands = rows[best], slot[best], hands[best]
+        out[rows, slot] = np.trunc(hands['landmarks'][..., :2] * (self.WIDTH, self.HEIGHT))
+        return out
+
+    def check_fingering_batch(self, keys, landmarks):
+        '''
+        Vectorised check_fingering() over many keystrokes.
+
+        keys: n typed keys. landmarks: [n, 2, 21, >=2] pixel coordinates, hand slot 0 = Left,
+        1 = Right, NaN for a missing hand (see pack_landmarks()). Returns int8 verdict codes
+        plus actual and expected finger indices into finger_names (-1 when not applicable).
+        Equal distances resolve in fingertip_indices order.
+        '''
+        landmarks = np.asarray(landmarks, dtype=np.float32)[..., :2]
+        n = len(keys)
+        rows = np.fromiter(map(self._key_index.get, keys, itertools.repeat(-1)), dtype=np.intp, count=n)
+        status = np.full(n, VERDICT_NO_RULE, dtype=np.int8)
+        actual = np.full(n, -1, dtype=np.int8)
+        expected = np.full(n, -1, dtype=np.int8)
+        
+        ruled = rows >= 0
+        expected[ruled] = self._key_finger[rows[ruled]]
+        target = self._key_pos[rows]
+        mapped = ruled & ~np.isnan(target[:, 0])
+        status[ruled & ~mapped] = VERDICT_UNMAPPED
+
+        # [n, 10] squared distance from every fingertip to the target key, inf for missing hands
+        tips = np.take(landmarks.reshape(n, -1, 2), self._tip_flat, axis=1)
+        diff = tips - target[:, None, :].astype(np.float32)
+        dists = np.einsum('ijk,ijk->ij', diff, diff)
+        np.copyto(dists, np.inf, where=np.isnan(dists))
+
+        idx = np.arange(n)
+        nearest = dists.argmin(axis=1)
+        min_dist = dists[idx, nearest]
+        exp_dist = dists[idx, np.maximum(expected, 0)]
+
+        unknown = min_dist > REACH_RADIUS ** 2
+        correct = (exp_dist < CORRECT_RADIUS ** 2) | (~unknown & (nearest == expected))
+        status[mapped & unknown] = VERDICT_UNKNOWN
+        status[mapped & ~unknown] = VERDICT_WRONG
+        status[mapped & correct] = VERDICT_CORRECT
+        actual[mapped & ~unknown] = nearest[mapped & ~unknown]
+        actual[mapped & correct] = expected[mapped & correct]
+        return status, actual, expected
\ No newline at end of file
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+'''
+YiTian - Optical Flow Tracker Module
+
+Copyright (c) 2025 Zhang Zhewei (Liyue-Wei)
+Licensed under the GNU GPL v3.0 License.
+'''
+
+import numpy as np
+import cv2
+try:
+    import shm_cfg
+except ModuleNotFoundError:
+    from extmodules import shm_cfg
+
+class FlowTracker:
+    '''
+    Pyramidal Lucas-Kanade tracking of a few points between full detections.
+
+    seed() takes the points found by MediaPipe on a grayscale frame, track()
+    follows them into each later frame. A point only counts as tracked if
+    flowing it back lands within fb_max pixels of where it started
+    (forward-backward check); confidence is the tracked share of the seeded points.
+    '''
+    def __init__(self, win=shm_cfg.FLOW_WIN, levels=shm_cfg.FLOW_LEVELS, fb_max=shm_cfg.FLOW_FB_MAX_PX):
+        self.lk_params = dict(winSize=(win, win), maxLevel=levels,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+        self.fb_max = fb_max
+        self.gray = None
+        self.points = None
+        self.tracked = None
+        self.seeded = 0
+        self.confidence = 0.0
+
+    def reset(self):
+        self.gray = None
+        self.points = None
+        self.tracked = None
+        self.confidence = 0.0
+
+    def seed(self, gray, points):
+        # points: [n, 2] pixel coordinates in gray, NaN rows are not tracked
+        self.tracked = ~np.isnan(points[:, 0])
+        if not self.tracked.any():
+            self.reset()
+            return
+
+        self.gray = gray
+        self.points = points.astype(np.float32)
+        self.seeded = self.tracked.sum()
+        self.confidence = 1.0
+
+    def active(self):
+        return self.gray is not None
+
+    def track(self, gray):
+        # Returns [n, 2] points in gray and the confidence, lost points keep their last position
+        if not self.tracked.any():
+            self.confidence = 0.0
+            return self.points, self.confidence
+        
+        p0 = self.points[self.tracked].reshape(-1, 1, 2)
+        p1, st1, _ = cv2.calcOpticalFlowPyrLK(self.gray, gray, p0, None, **self.lk_params)
+        back, st0, _ = cv2.calcOpticalFlowPyrLK(gray, self.gray, p1, None, **self.lk_params)
+        fb_err = np.linalg.norm((p0 - back).reshape(-1, 2), axis=1)
+        good = (st1.ravel() == 1) & (st0.ravel() == 1) & (fb_err < self.fb_max)
+
+        idx = np.flatnonzero(self.tracked)
+        self.points[idx[good]] = p1.reshape(-1, 2)[good]
+        self.tracked[idx[~good]] = False
+        self.confidence = self.tracked.sum() / self.seeded
+        self.gray = gray
+        return self.points, self.confidence
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+'''
+YiTian - Frame Ring Module
+
+Copyright (c) 2025 Zhang Zhewei (Liyue-Wei)
+Licensed under the GNU GPL v3.0 License. 
+'''
+
+from collections import namedtuple
+import math
+import numpy as np
+try:
+    import shm_cfg
+except ModuleNotFoundError:
+    from extmodules import shm_cfg
+
+# Header words (int64, from byte 8; byte 0 is the FLAG_IDLE/FLAG_EXIT control flag)
+HDR_PUBLISHED = 0       # number of frames published so far (= frames copied by the camera)
+HDR_CONSUMED = 1        # newest frame number a reader has finished with (consumer ack)
+HDR_SKIPPED = 2         # frames grabbed but not decoded or copied because no reader was ready
+
+# Geometry words, filled by the camera from what the device negotiated; HDR_VERSION is written last
+HDR_VERSION = 3         # FRAME_VERSION once the words below are valid, 0 before
+HDR_WIDTH = 4
+HDR_HEIGHT = 5
+HDR_CHANNELS = 6
+HDR_PIXFMT = 7          # fourcc of the pixel layout
+HDR_STRIDE = 8          # bytes per row
+HDR_FPS = 9
+HDR_SLOTS = 10
+
+HDR_DROPPED = 11        # published frames overwritten before a reader caught up to them
+
+FRAME_VERSION = 1
+PIXFMT_BGR24 = int.from_bytes(b'BGR3', 'little')
+
+Geometry = namedtuple('Geometry', ['width', 'height', 'channels', 'pixfmt', 'stride', 'fps', 'slots'])
+
+# Slot header words (int64)
+SLOT_SEQ = 0            # seqlock counter, odd while the slot is being written
+SLOT_FRAME_NO = 1       # monotonic frame number, starting from 1
+SLOT_TIMESTAMP = 2      # capture time, time.perf_counter_ns()
+
+def segment_size(width, height, channels=shm_cfg.CHANNELS, slots=shm_cfg.FRAME_SLOTS):
+    return shm_cfg.FRAME_HEADER_SIZE + slots * (shm_cfg.SLOT_HEADER_SIZE + width * height * channels)
+
+def history_slots(fps):
+    # Slots needed to keep REFINE_HISTORY_NS of frames at fps, never fewer than FRAME_SLOTS
+    if not shm_cfg.REFINE_ON_KEY:
+        return shm_cfg.FRAME_SLOTS
+    return max(shm_cfg.FRAME_SLOTS, math.ceil(shm_cfg.REFINE_HISTORY_NS * fps / 1e9) + 1)
+
+def geometry(buf):
+    # Geometry published in the frame segment header, None until the camera has written it
+    header = np.ndarray(((shm_cfg.FRAME_HEADER_SIZE - 8) // 8,), dtype=np.int64, buffer=buf, offset=8)
+    if header[HDR_VERSION] != FRAME_VERSION:
+        return None
+    return Geometry(*(int(v) for v in header[HDR_WIDTH : HDR_SLOTS + 1]))
+
+class FrameRing:
+    '''
+    Multi-slot frame ring living in the frame segment.
+
+    The writer always fills the slot after the newest one and bumps its sequence
+    counter before and after the write, so it never waits for a reader. Readers
+    work on the newest slot in place and only trust the result if the counter
+    was even and unchanged across the read; otherwise they retry on the new newest slot.
+    With FRAME_SLOTS = 1 the ring degrades to the old single-buffer behaviour.
+
+    The writer passes the negotiated width, height and fps and the ring
+    records them in the segment header; readers pass only the buffer and
+    take the geometry from there.
+
+    Successful reads acknowledge their frame number. Frames overwritten before a
+    reader caught up to them are counted by dropped(); a writer in FRAME_ACK mode
+    can instead check ready() and skip copying frames nobody will read.
+    '''
+    def __init__(self, buf, width=None, height=None, fps=shm_cfg.FPS, channels=shm_cfg.CHANNELS, slots=shm_cfg.FRAME_SLOTS):
+        self.header = np.ndarray(((shm_cfg.FRAME_HEADER_SIZE - 8) // 8,), dtype=np.int64, buffer=buf, offset=8)
+        if width is not None:
+            self.header[HDR_VERSION] = 0
+            self.header[HDR_WIDTH : HDR_SLOTS + 1] = (width, height, channels, PIXFMT_BGR24, width * channels, fps, slots)
+            self.header[HDR_VERSION] = FRAME_VERSION
+        elif self.header[HDR_VERSION] != FRAME_VERSION:
+            raise ValueError(f"Frame segment version {int(self.header[HDR_VERSION])} unsupported, expected {FRAME_VERSION}")
+
+        self.width, self.height, self.channels, self.pixfmt, self.stride, self.fps, self.slots = \
+            (int(v) for v in self.header[HDR_WIDTH : HDR_SLOTS + 1])
+        if self.pixfmt != PIXFMT_BGR24:
+            raise ValueError(f"Frame pixel format {self.pixfmt.to_bytes(4, 'little')} unsupported")
+        
+        frame_bytes = self.stride * self.height
+        self.slot_header = np.ndarray((self.slots, shm_cfg.SLOT_HEADER_SIZE // 8), dtype=np.int64, 
+                                      buffer=buf, offset=shm_cfg.FRAME_HEADER_SIZE)
+        self.frames = np.ndarray((self.slots, self.height, self.width, self.channels), dtype=np.uint8, 
+                                 buffer=buf, offset=shm_cfg.FRAME_HEADER_SIZE + self.slots * shm_cfg.SLOT_HEADER_SIZE,
+                                 strides=(frame_bytes, self.stride, self.channels, 1))
+        self.slot = -1
+        self.frame_no = 0
+        self.timestamp_ns = 0
+        self.reads = 0
+        self.torn = 0
+
+    def acquire(self):
+        # Always the oldest slot; readers work on the newest one
+        self.slot = int(self.header[HDR_PUBLISHED]) % self.slots
+        if self.slot_header[self.slot, SLOT_FRAME_NO] > self.header[HDR_CONSUMED]:
+            self.header[HDR_DROPPED] += 1
+        self.slot_header[self.slot, SLOT_SEQ] += 1
+        return self.frames[self.slot]
+
+    def publish(self, timestamp_ns):
+        published = int(self.header[HDR_PUBLISHED])
+        self.slot_header[self.slot, SLOT_FRAME_NO] = published + 1
+        self.slot_header[self.slot, SLOT_TIMESTAMP] = timestamp_ns
+        self.slot_header[self.slot, SLOT_SEQ] += 1
+        self.header[HDR_PUBLISHED] = published + 1
+
+    def abort(self):
+        # Leaves the slot unpublished; only safe with more than one slot
+        self.slot_header[self.slot, SLOT_SEQ] += 1
+
+    def ready(self, lag=max(shm_cfg.FRAME_SLOTS - 1, 1)):
+        # Writer side: True while fewer than `lag` published frames are still unread
+        return int(self.header[HDR_PUBLISHED]) - int(self.header[HDR_CONSUMED]) < lag
+
+    def skip(self):
+        self.header[HDR_SKIPPED] += 1
+
+    def ack(self, frame_no):
+        if frame_no > self.header[HDR_CONSUMED]:
+            self.header[HDR_CONSUMED] = frame_no
+
+    def counts(self):
+        # Capture-side (copied, skipped) frame counts
+        return int(self.header[HDR_PUBLISHED]), int(self.header[HDR_SKIPPED])
+
+    def dropped(self):
+        return int(self.header[HDR_DROPPED])
+
+    def latest(self):
+        return int(self.header[HDR_PUBLISHED])
+
+    def latest_timestamp(self):
+        # Capture time of the newest published frame, 0 before the first one
+        published = int(self.header[HDR_PUBLISHED])
+        if not published:
+            return 0
+        return int(self.slot_header[(published - 1) % self.slots, SLOT_TIMESTAMP])
+
+    def read(self, consume, after=0, retries=3, ack=True):
+        # Returns None when no frame newer than `after` is available.
+        # ack=False for observers (preview) that must not hold back or release the writer
+        for _ in range(retries):
+            published = int(self.header[HDR_PUBLISHED])
+            if published <= after:
+                return None
+            
+            slot = (published - 1) % self.slots
+            seq = int(self.slot_header[slot, SLOT_SEQ])
+            if seq & 1:
+                self.torn += 1
+                continue
+
+            frame_no = int(self.slot_header[slot, SLOT_FRAME_NO])
+            timestamp_ns = int(self.slot_header[slot, SLOT_TIMESTAMP])
+            out = consume(self.frames[slot])
+            if int(self.slot_header[slot, SLOT_SEQ]) == seq:
+                self.frame_no = frame_no
+                self.timestamp_ns = timestamp_ns
+                self.reads += 1
+                if ack:
+                    self.ack(frame_no)
+                return out
+            self.torn += 1
+
+        return None
+
+    def read_frame(self, frame_no, consume):
+        # Reads one specific frame, None once the writer has moved past it
+        slot = (frame_no - 1) % self.slots
+        seq = int(self.slot_header[slot, SLOT_SEQ])
+        if seq & 1 or int(self.slot_header[slot, SLOT_FRAME_NO]) != frame_no:
+            return None
+        
+        timestamp_ns = int(self.slot_header[slot, SLOT_TIMESTAMP])
+        out = consume(self.frames[slot])
+        if int(self.slot_header[slot, SLOT_SEQ]) == seq:
+            self.frame_no = frame_no
+            self.timestamp_ns = timestamp_ns
+            self.reads += 1
+            self.ack(frame_no)
+            return out
+        
+        self.torn += 1
+        return None
+
+    def read_at(self, timestamp_ns, consume):
+        # Reads the held frame captured closest to timestamp_ns, None if there is none
+        frame_nos = self.slot_header[:, SLOT_FRAME_NO].copy()
+        skew = np.abs(self.slot_header[:, SLOT_TIMESTAMP] - timestamp_ns)
+        skew[frame_nos == 0] = np.iinfo(np.int64).max
+        slot = int(np.argmin(skew))
+        if frame_nos[slot] == 0:
+            return None
+        return self.read_frame(int(frame_nos[slot]), consume)
+
+    def close(self):
+        # Views must be dropped before SharedMemory.close() can release the buffer
+        self.header = None
+        self.slot_header = None
+        self.frames = None
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+'''
+YiTian - Inference Governor Module
+
+Copyright (c) 2025 Zhang Zhewei (Liyue-Wei)
+Licensed under the GNU GPL v3.0 License.
+'''
+
+import time
+try:
+    import shm_cfg
+except ModuleNotFoundError:
+    from extmodules import shm_cfg
+try:
+    import psutil
+except ModuleNotFoundError:
+    psutil = None       # falls back to this process's CPU time, see Governor.cpu_load()
+
+EMA_ALPHA = 0.2
+HEADROOM = 0.5          # step up only while latency stays under this share of the budget
+STEP_UP_INTERVALS = 3   # ... for this many intervals in a row
+
+class Governor:
+    '''
+    Live replacement for the old one-shot fps_calibration().
+
+    The detector reports how long each inference took, when each inferred
+    result was published relative to its capture time, and each frame it
+    skipped on purpose (stride, motion gate). Flow back-fill of frames missed
+    during an inference counts for neither. Once per interval the governor
+    compares the landmark rate and end-to-end latency against their targets and
+    moves one step along `levels` (model_complexity, input scale, inference
+    stride), ordered from best to cheapest: down as soon as it falls behind, up
+    only after a few intervals of clear headroom with CPU to spare.
+    '''
+    def __init__(self, levels=shm_cfg.GOVERNOR_LEVELS, level=shm_cfg.GOVERNOR_START, target_rate=shm_cfg.GOVERNOR_TARGET_RATE,
+                 latency_ns=shm_cfg.GOVERNOR_LATENCY_NS, interval_ns=shm_cfg.GOVERNOR_INTERVAL_NS, cpu_high=shm_cfg.GOVERNOR_CPU_HIGH):
+        self.levels = levels
+        self.level = level
+        self.target_rate = target_rate
+        self.latency_budget = latency_ns
+        self.interval_ns = interval_ns
+        self.cpu_high = cpu_high
+        self.infer_ns = 0.0
+        self.latency_ns = 0.0
+        self.inferences = 0
+        self.published = 0
+        self.skipped = 0
+        self.headroom = 0
+        self.t_ns = time.perf_counter_ns()
+        self.cpu_ns = time.process_time_ns()
+        if psutil is not None:
+            psutil.cpu_percent()    # starts the first measuring interval
+        self.frames = None
+        self.metrics = {'level': level, 'infer_ms': 0.0, 'latency_ms': 0.0, 'rate': 0.0, 'infer_rate': 0.0, 'cpu': 0.0}
+
+    def setting(self):
+        # (model_complexity, scale, stride) of the current level
+        return self.levels[self.level]
+
+    @property
+    def stride(self):
+        return self.levels[self.level][2]
+
+    def on_inference(self, duration_ns):
+        self.inferences += 1
+        self.infer_ns += EMA_ALPHA * (duration_ns - self.infer_ns)
+
+    def on_publish(self, timestamp_ns):
+        # An inferred result published, timestamp_ns is its frame's capture time
+        self.published += 1
+        self.latency_ns += EMA_ALPHA * (time.perf_counter_ns() - timestamp_ns - self.latency_ns)
+
+    def on_skip(self):
+        # A frame handled in time without inference: repeated on a stride or by the motion gate
+        self.skipped += 1
+
+    def cpu_load(self, cpu_ns, elapsed):
+        # Machine-wide CPU use 0..1 since the last interval; without psutil this process's CPU time
+        # in cores, i.e. 1.0 once the detector keeps one core busy
+        if psutil is not None:
+            return psutil.cpu_percent() / 100
+        return (cpu_ns - self.cpu_ns) / 1e9 / elapsed
+
+    def update(self, frames):
+        # frames: camera frames grabbed so far, copied or not. Returns True when the level changed.
+        now = time.perf_counter_ns()
+        if now - self.t_ns < self.interval_ns:
+            return False
+
+        elapsed = (now - self.t_ns) / 1e9
+        cpu_ns = time.process_time_ns()
+        rate = (self.published + self.skipped) / elapsed
+        camera_rate = (frames - self.frames) / elapsed if self.frames is not None else rate
+        cpu = self.cpu_load(cpu_ns, elapsed)
+        self.metrics.update(infer_ms=round(self.infer_ns / 1e6, 1), latency_ms=round(self.latency_ns / 1e6, 1),
+                            rate=round(rate, 1), infer_rate=round(self.inferences / elapsed, 1), cpu=round(cpu, 2))
+        self.t_ns, self.cpu_ns, self.frames = now, cpu_ns, frames
+        self.inferences = self.published = self.skipped = 0
+
+        # A camera slower than the target can not be caught up with by a cheaper model
+        target = min(self.target_rate, 0.9 * camera_rate)
+        reason = None
+        if self.latency_ns > self.latency_budget or rate < target:
+            self.headroom = 0
+            if self.level < len(self.levels) - 1:
+                self.level += 1
+                reason = f"latency {self.latency_ns / 1e6:.0f} ms, rate {rate:.0f}/s"
+        elif self.latency_ns < HEADROOM * self.latency_budget and cpu < self.cpu_high:
+            self.headroom += 1
+            if self.headroom >= STEP_UP_INTERVALS and self.level > 0:
+                self.level -= 1
+                self.headroom = 0
+                reason = f"headroom, latency {self.latency_ns / 1e6:.0f} ms, cpu {cpu:.0%}"
+        else:
+            self.headroom = 0
+
+        self.metrics['level'] = self.level
+        if reason is None:
+            return False
+        complexity, scale, stride = self.setting()
+        print(f"Process: Governor level {self.level} (complexity {complexity}, scale {scale}, stride {stride}): {reason}.")
+        return True
@@ -7,84 +7,533 @@ Licensed under the GNU GPL v3.0 License.
 '''
 
 from multiprocessing import shared_memory
+from multiprocessing import connection
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+import argparse
 import mediapipe as mp
 import numpy as np
 import cv2
 import time
 try:
     import shm_cfg
+    import frame_ring
+    import doorbell
+    import shm_control
+    import landmark_ring
+    import result_segment
+    import stabilizer
+    import tracker
+    import flow_tracker
+    import governor
 except ModuleNotFoundError:
     from extmodules import shm_cfg
+    from extmodules import frame_ring
+    from extmodules import doorbell
+    from extmodules import shm_control
+    from extmodules import landmark_ring
+    from extmodules import result_segment
+    from extmodules import stabilizer
+    from extmodules import tracker
+    from extmodules import flow_tracker
+    from extmodules import governor
+
+STATS_INTERVAL = 5
+HAND_FLOATS = result_segment.HAND_FLOATS
+TIP_COLS = 2 + 3 * np.array(tracker.TIP_INDICES)     # x columns of the fingertips in a [hands, HAND_FLOATS] row
     
 class HandDetector:
-    def __init__(self, mode=False, max_hands=2, model_complexity=0, detection_con=0.85, track_con=0.85):
+    '''
+    publish: own the result, control and history segments and the doorbell (False for pool workers).
+    infer: load the MediaPipe graph (False for the pool merger, which only publishes).
+    split: once the keyboard split is published, run one single-hand graph per half in parallel threads.
+    refine: serve keystroke refinement requests with a model_complexity=1 graph on a thread of its own (publisher only).
+    '''
+    def __init__(self, mode=False, max_hands=2, model_complexity=0, detection_con=0.85, track_con=0.85, 
+                 publish=True, infer=True, split=False, refine=shm_cfg.REFINE_ON_KEY):
+        self.publish_results = publish
         self.shm_frame = None
         self.shm_result = None
-        self.float_arr_len = (shm_cfg.RESULT_SIZE - 4) // 4
+        self.results = None
+        self.shm_control = None
+        self.shm_history = None
+        self.ring = None
+        self.bell = None
+        self.control = None
+        self.history = None
+        self.frame_no = 0
+        self.timestamp_ns = 0
+        self.stats = {'processed': 0, 'dropped': 0, 'duplicate': 0, 'late': 0, 'skipped': 0, 'strided': 0, 'tracked': 0, 
+                      'flow_lost': 0, 'refined': 0, 'refine_missed': 0}
+        self.roi = None
+        self.roi_gen = 0
+        self.lm_scale = np.ones(3, dtype=np.float32)
+        self.lm_offset = np.zeros(3, dtype=np.float32)
+        self.filter = None
+        self.filter_on = shm_cfg.FILTER_MODE is not None
+        self.filter_gen = 0
+        self.split = None
+        self.split_gen = 0
+        self.halves = []    # (first column, last column, label) in the prepared image
+        self.tracker = tracker.FingertipTracker()
+        self.gate_on = shm_cfg.MOTION_GATE
+        self.gate_ref = None
+        self.key_gen = 0
+        self.last_hands = None
+        self.reused = False
+        self.flow = flow_tracker.FlowTracker() if shm_cfg.FLOW_TRACKING and publish and infer else None
+        self.flow_hands = None
+        self.flow_size = None
+        self.scale = shm_cfg.ROI_SCALE
+        self.infer_frame_no = 0
+        self.stride_key_gen = 0
+        self.detect_now = False     # flow lost the fingertips, infer on the next frame whatever the stride
 
         try:
             self.shm_frame = shared_memory.SharedMemory(name=shm_cfg.SHM_FRAME_ID)
             print("Process: Shared Memory Frame connected.")
         except FileNotFoundError:
             raise FileNotFoundError(f"Shared Memory unavaliable: {shm_cfg.SHM_FRAME_ID}")
-        
-        try:
-            self.shm_result = shared_memory.SharedMemory(create=True, size=shm_cfg.RESULT_SIZE, name=shm_cfg.SHM_RESULT_ID)
+        self.ring = frame_ring.FrameRing(self.shm_frame.buf)
+        self.width, self.height = self.ring.width, self.ring.height
+        print(f"Process: Frame geometry {self.width}x{self.height}x{self.ring.channels} @ {self.ring.fps} fps.")
+        self.filter = stabilizer.LandmarkFilter(shm_cfg.FILTER_MODE or 'ema', hands=max_hands, fps=self.ring.fps)
+
+        if publish:
+            self.bell = doorbell.Doorbell(listen=True)
+            self.shm_result = self._create_shm(shm_cfg.SHM_RESULT_ID, result_segment.SEGMENT_SIZE)
+            self.results = result_segment.ResultSegment(self.shm_result.buf, create=True)
             print("Process: Shared Memory Result created.")
+            self.shm_control = self._create_shm(shm_cfg.SHM_CONTROL_ID, shm_cfg.CONTROL_SIZE)
+            print("Process: Shared Memory Control created.")
+            self.shm_history = self._create_shm(shm_cfg.SHM_HISTORY_ID, landmark_ring.SEGMENT_SIZE)
+            self.history = landmark_ring.LandmarkRing(self.shm_history.buf)
+            print("Process: Shared Memory History created.")
+        else:
+            try:
+                self.shm_control = shared_memory.SharedMemory(name=shm_cfg.SHM_CONTROL_ID)
+                print("Process: Shared Memory Control connected.")
+            except FileNotFoundError:
+                raise FileNotFoundError(f"Shared Memory unavaliable: {shm_cfg.SHM_CONTROL_ID}")
+        self.control = shm_control.ControlBlock(self.shm_control.buf)
+
+        self.mp_hands = mp.solutions.hands
+        self.graph_args = (mode, max_hands, detection_con, track_con)
+        self.graphs = {}
+        self.complexity = None
+        self.hands = None
+        self.half_hands = []
+        # MediaPipe releases the GIL while a graph runs, so threads are enough for the two halves
+        self.executor = ThreadPoolExecutor(max_workers=2) if infer and split else None
+        if infer:
+            self._use_complexity(model_complexity)
+        self.governor = None
+        if shm_cfg.GOVERNOR and publish and infer:
+            self.governor = governor.Governor()
+            self._apply_governor()
+        self.refine_hands = None
+        self.refine_ring = None
+        self.refine_executor = None
+        self.refine_future = None
+        self.refine_served = 0
+        if publish and refine:
+            # Own ring reader and thread, so refinement never stalls the tracking loop
+            self.refine_hands = self.mp_hands.Hands(True, max_hands, 1, detection_con, track_con)
+            self.refine_ring = frame_ring.FrameRing(self.shm_frame.buf)
+            self.refine_executor = ThreadPoolExecutor(max_workers=1)
+        self.result = None
+
+    def _use_complexity(self, complexity):
+        # Graphs are built on first use and kept, so later governor switches are instant
+        if complexity not in self.graphs:
+            mode, max_hands, detection_con, track_con = self.graph_args
+            halves = [self.mp_hands.Hands(mode, 1, complexity, detection_con, track_con) for _ in range(2)] if self.executor else []
+            self.graphs[complexity] = (self.mp_hands.Hands(mode, max_hands, complexity, detection_con, track_con), halves)
+        self.hands, self.half_hands = self.graphs[complexity]
+        self.complexity = complexity
+
+    def _apply_governor(self):
+        complexity, scale, _ = self.governor.setting()
+        if complexity != self.complexity:
+            self._use_complexity(complexity)
+        scale *= shm_cfg.ROI_SCALE
+        if scale != self.scale:
+            # Prepared image size changes: gate reference and flow points are stale
+            self.scale = scale
+            self.gate_ref = None
+            if self.flow is not None:
+                self.flow.reset()
+            self._update_halves()
+
+    def _create_shm(self, name, size):
+        try:
+            return shared_memory.SharedMemory(create=True, size=size, name=name)
         except FileExistsError:
-            print("Process: Shared Memory already exists. Cleaning up...")
+            print(f"Process: Shared Memory {name} already exists. Cleaning up...")
             try:
-                with shared_memory.SharedMemory(name=shm_cfg.SHM_RESULT_ID) as temp_shm:
-                    temp_shm.unlink()
+                temp_shm = shared_memory.SharedMemory(name=name)
+                temp_shm.close()
+                temp_shm.unlink()
             except FileNotFoundError:
                 pass
             except Exception as e:
                 self.cleanup()
                 raise RuntimeError(f"Unexpected error occurred: {e}")
             
-            self.shm_result = shared_memory.SharedMemory(create=True, size=shm_cfg.RESULT_SIZE, name=shm_cfg.SHM_RESULT_ID)
+            return shared_memory.SharedMemory(create=True, size=size, name=name)
 
-        self.mp_hands = mp.solutions.hands
-        self.hands = self.mp_hands.Hands(mode, max_hands, model_complexity, detection_con, track_con)
-        self.result = None
+    def _update_roi(self):
+        self.roi_gen, self.roi = self.control.get_roi()
+        if self.roi is None:
+            self.lm_scale[:] = 1.0
+            self.lm_offset[:] = 0.0
+            print("Process: Keyboard ROI cleared, running on full frame.")
+            return
+        
+        x0, y0, x1, y1 = self.roi
+        w, h = x1 - x0, y1 - y0
+        self.lm_scale[:] = (w / self.width, h / self.height, w / self.width)
+        self.lm_offset[:] = (x0 / self.width, y0 / self.height, 0.0)
+        print(f"Process: Keyboard ROI set to {self.roi}.")
+        self.gate_ref = None
+        if self.flow is not None:
+            self.flow.reset()
+        self._update_halves()
+
+    def _update_split(self):
+        self.split_gen, self.split = self.control.get_split()
+        if self.split is None:
+            print("Process: Keyboard split cleared, running both hands in one graph.")
+        else:
+            print(f"Process: Keyboard split set to {self.split}.")
+        self._update_halves()
 
-    def read_img(self):
-        shm_buf = self.shm_frame.buf
-        if shm_buf[0] == shm_cfg.FLAG_IDLE:
-            frame_array = np.ndarray((shm_cfg.HEIGHT, shm_cfg.WIDTH, shm_cfg.CHANNELS), dtype=np.uint8, buffer=shm_buf, offset=1)
-            return cv2.cvtColor(frame_array, cv2.COLOR_BGR2RGB)
+    def _update_halves(self):
+        # Split line -> column ranges of the prepared (cropped, scaled) image, low-x half first
+        self.halves = []
+        if self.split is None or not self.half_hands:
+            return
         
-        elif shm_buf[0] == shm_cfg.FLAG_EXIT:
+        x, overlap, left_first = self.split
+        x0, y0, x1, y1 = self.roi if self.roi is not None else (0, 0, self.width, self.height)
+        scale = self.scale
+        width = int((x1 - x0) * scale)
+        lo = min(max(int((x - x0 + overlap) * scale), 1), width)
+        hi = min(max(int((x - x0 - overlap) * scale), 0), width - 1)
+        self.halves = [(0, lo, 1.0 if left_first else 0.0), (hi, width, 0.0 if left_first else 1.0)]
+
+    def _update_filter(self):
+        self.filter_gen, params = self.control.get_filter()
+        if params is None:
+            return
+        
+        mode = params.pop('mode')
+        self.filter_on = mode is not None
+        if self.filter_on:
+            self.filter.configure(mode, **params)
+            self.filter.reset()
+        print(f"Process: Landmark filter set to {mode} {params}.")
+
+    def _crop(self, frame):
+        if self.roi is not None:
+            x0, y0, x1, y1 = self.roi
+            frame = frame[y0:y1, x0:x1]
+        if self.scale < 1.0:
+            frame = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return frame
+
+    def _prepare(self, frame):
+        return cv2.cvtColor(self._crop(frame), cv2.COLOR_BGR2RGB)
+
+    def _prepare_gray(self, frame):
+        return cv2.cvtColor(self._crop(frame), cv2.COLOR_BGR2GRAY)
+
+    def exit_requested(self):
+        return self.shm_frame.buf[0] == shm_cfg.FLAG_EXIT
+
+    def read_img(self, frame_no=None):
+        # Newest unprocessed frame, or exactly frame_no when given (pool workers)
+        if self.exit_requested():
             print("Process: Received EXIT Flag.")
             return False
         
-        return None
+        if frame_no is None and self.ring.latest() == self.frame_no:
+            self.stats['duplicate'] += 1
+            return None
+        
+        if self.control.generation(shm_control.CTRL_ROI) != self.roi_gen:
+            self._update_roi()
+        if self.half_hands and self.control.generation(shm_control.CTRL_SPLIT) != self.split_gen:
+            self._update_split()
+
+        if frame_no is None:
+            img = self.ring.read(self._prepare, after=self.frame_no)
+        else:
+            img = self.ring.read_frame(frame_no, self._prepare)
+            if img is None:
+                self.stats['dropped'] += 1
+                return None
+            self.frame_no = 0   # Gaps between a worker's frames are other workers' frames
+
+        if img is not None:
+            if self.frame_no:
+                self.stats['dropped'] += self.ring.frame_no - self.frame_no - 1
+            self.frame_no = self.ring.frame_no
+            self.timestamp_ns = self.ring.timestamp_ns
+            self.stats['processed'] += 1
+        
+        return img
     
-    def find_hands(self, img):
+    def print_stats(self):
+        stats = ", ".join(f"{k}: {v}" for k, v in self.stats.items())
+        skip_rate = self.stats['skipped'] / max(self.stats['processed'], 1)
+        print(f"Process: Frames {stats}, torn: {self.ring.torn}, skip rate: {skip_rate:.1%}.")
+        copied, skipped = self.ring.counts()
+        print(f"Process: Capture copied: {copied}, skipped: {skipped}, dropped: {self.ring.dropped()}.")
+        if self.governor is not None:
+            metrics = ", ".join(f"{k}: {v}" for k, v in self.governor.metrics.items())
+            print(f"Process: Governor {metrics}.")
+    
+    def _to_array(self, result, scale, offset):
+        # MediaPipe result -> [hands, HAND_FLOATS] float32, landmarks mapped by lms * scale + offset
+        if not result.multi_hand_landmarks:
+            return np.empty((0, HAND_FLOATS), dtype=np.float32)
+        
+        count = min(len(result.multi_hand_landmarks), 2)
+        hands = np.empty((count, HAND_FLOATS), dtype=np.float32)
+        for i, (hand_lms, hand_info) in enumerate(zip(result.multi_hand_landmarks[:count], result.multi_handedness)):
+            hands[i, 0] = 1.0 if hand_info.classification[0].label == 'Right' else 0.0
+            hands[i, 1] = hand_info.classification[0].score
+            lms_np = np.array([[lm.x, lm.y, lm.z] for lm in hand_lms.landmark], dtype=np.float32)
+            hands[i, 2:] = (lms_np * scale + offset).flatten()
+        return hands
+
+    def _detect_half(self, graph, img, start, stop):
+        return graph.process(np.ascontiguousarray(img[:, start:stop]))
+
+    def _still(self, img):
+        # Motion gate: True while the downsampled frame barely differs from the last inferred one
+        thumb = cv2.cvtColor(cv2.resize(img, shm_cfg.MOTION_GATE_SIZE, interpolation=cv2.INTER_AREA), cv2.COLOR_RGB2GRAY)
+        key_gen = self.control.generation(shm_control.CTRL_KEY)
+        if self.gate_ref is not None and key_gen == self.key_gen:
+            changed = np.count_nonzero(cv2.absdiff(thumb, self.gate_ref) > shm_cfg.MOTION_PIXEL_DIFF)
+            if changed < shm_cfg.MOTION_MIN_PIXELS:
+                return True
+        
+        self.gate_ref = thumb
+        self.key_gen = key_gen
+        return False
+
+    def detect(self, img):
+        # MediaPipe landmarks as a [hands, HAND_FLOATS] float32 array in full-frame coordinates,
+        # the previous ones (self.reused) when the motion gate finds nothing moved
+        self.reused = self.gate_on and self._still(img)
+        if self.reused:
+            self.stats['skipped'] += 1
+            return self.last_hands
+        
+        start = time.perf_counter_ns()
+        self.last_hands = self.infer(img)
+        if self.governor is not None:
+            self.governor.on_inference(time.perf_counter_ns() - start)
+        return self.last_hands
+
+    def infer(self, img):
+        if self.halves:
+            return self.detect_split(img)
+        
         self.result = self.hands.process(img)
-        shm_buf = self.shm_result.buf
+        return self._to_array(self.result, self.lm_scale, self.lm_offset)   # ROI crop -> full frame
 
-        if self.result.multi_hand_landmarks:
-            count = len(self.result.multi_hand_landmarks)
-            shm_buf[0] = min(count, 2)
-            result_arr = np.ndarray((self.float_arr_len,), dtype=np.float32, buffer=shm_buf, offset=4)
+    def detect_split(self, img):
+        # One single-hand graph per keyboard half, labelled by side instead of MediaPipe handedness
+        futures = [self.executor.submit(self._detect_half, graph, img, start, stop) 
+                   for graph, (start, stop, _) in zip(self.half_hands, self.halves)]
+        width = img.shape[1]
+        hands = []
+        for future, (start, stop, label) in zip(futures, self.halves):
+            scale = np.float32(((stop - start) / width, 1.0, (stop - start) / width))
+            offset = np.float32((start / width, 0.0, 0.0))
+            half = self._to_array(future.result(), scale * self.lm_scale, offset * self.lm_scale + self.lm_offset)
+            half[:, 0] = label
+            hands.append(half)
+        return np.concatenate(hands)
 
-            index = 0
-            for hand_lms, hand_info in zip(self.result.multi_hand_landmarks, self.result.multi_handedness):
-                result_arr[index] = 1.0 if hand_info.classification[0].label == 'Right' else 0.0
-                result_arr[index+1] = hand_info.classification[0].score
-                lms_np = np.array([[lm.x, lm.y, lm.z] for lm in hand_lms.landmark], dtype=np.float32)
-                result_arr[index+2 : index+65] = lms_np.flatten()
-                index += 65
+    def refine_requested(self):
+        return self.refine_hands is not None and self.control.refine_count() > self.refine_served
 
-        else:
-            shm_buf[0] = 0
+    def serve_refines(self):
+        # Hands the queued requests to the refine thread unless it is still busy with earlier ones
+        if self.refine_future is None or self.refine_future.done():
+            self.refine_future = self.refine_executor.submit(self.refine)
+
+    def refine(self):
+        # Refine thread: every request queued so far, oldest first
+        try:
+            for request, timestamp_ns, box in self.control.get_refines(self.refine_served):
+                self._refine_one(request, timestamp_ns, box)
+                self.refine_served = request
+        except Exception as e:
+            print(f"Error: Refinement failed: {e}")
+
+    def _refine_one(self, request, timestamp_ns, box):
+        # High-accuracy tier: model_complexity=1 on a crop around the pressed key, in the held frame nearest the press
+        period_ns = 1e9 / self.refine_ring.fps
+        # The main process may ask before the frame after the press is published
+        deadline = time.perf_counter_ns() + 2 * period_ns
+        while self.refine_ring.latest_timestamp() < timestamp_ns and time.perf_counter_ns() < deadline:
+            time.sleep(0.002)
+
+        x0, y0, x1, y1 = box
+        img = self.refine_ring.read_at(timestamp_ns, lambda frame: cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2RGB))
+        if img is None or abs(self.refine_ring.timestamp_ns - timestamp_ns) > shm_cfg.REFINE_MAX_SKEW_FRAMES * period_ns:
+            self.control.set_refined(request, 0, 0, None)
+            self.stats['refine_missed'] += 1
+            return
+
+        w, h = x1 - x0, y1 - y0
+        scale = np.float32((w / self.width, h / self.height, w / self.width))
+        offset = np.float32((x0 / self.width, y0 / self.height, 0.0))
+        hands = self._to_array(self.refine_hands.process(img), scale, offset)
+        self.control.set_refined(request, self.refine_ring.frame_no, self.refine_ring.timestamp_ns, hands)
+        self.stats['refined'] += 1
+
+    def _seed_flow(self, img, hands):
+        # Fingertips of the latest detection -> flow points in prepared-image pixels
+        self.flow_size = np.float32((img.shape[1], img.shape[0]))
+        self.flow_hands = hands
+        tips = np.stack((hands[:, TIP_COLS], hands[:, TIP_COLS + 1]), axis=-1).reshape(-1, 2)
+        points = (tips - self.lm_offset[:2]) / self.lm_scale[:2] * self.flow_size
+        self.flow.seed(cv2.cvtColor(img, cv2.COLOR_RGB2GRAY), points)
+
+    def flow_active(self):
+        return self.flow is not None and self.flow.active()
+
+    def track_gap(self):
+        # Optical flow over the frames captured during the last inference, published as RECORD_TRACKED.
+        # The newest frame is tracked too while the governor's stride says no inference is due.
+        latest = self.ring.latest()
+        due = self.governor is None or latest - self.infer_frame_no >= self.governor.stride
+        for frame_no in range(self.frame_no + 1, latest if due else latest + 1):
+            gray = self.ring.read_frame(frame_no, self._prepare_gray)
+            if gray is None:
+                continue
+            
+            points, confidence = self.flow.track(gray)
+            if confidence < shm_cfg.FLOW_MIN_CONFIDENCE:
+                # Drifted, the newest frame gets a full detection past the stride and the motion gate
+                self.stats['flow_lost'] += 1
+                self.flow.reset()
+                self.gate_ref = None
+                self.detect_now = True
+                return
+
+            tips = points / self.flow_size * self.lm_scale[:2] + self.lm_offset[:2]
+            hands = self.flow_hands.copy()
+            hands[:, TIP_COLS] = tips[:, 0].reshape(-1, len(TIP_COLS))
+            hands[:, TIP_COLS + 1] = tips[:, 1].reshape(-1, len(TIP_COLS))
+            self.stats['dropped'] += frame_no - self.frame_no - 1
+            self.frame_no = frame_no
+            self.timestamp_ns = self.ring.timestamp_ns
+            self.stats['tracked'] += 1
+            if frame_no == latest and self.governor is not None:
+                self.governor.on_skip()     # Stride frame tracked on purpose, not caught up on
+            self.publish(hands, landmark_ring.RECORD_TRACKED)
+
+    def publish(self, hands, flags=0):
+        if self.control.generation(shm_control.CTRL_FILTER) != self.filter_gen:
+            self._update_filter()
+
+        # Stabilization stage, on a copy so reused landmarks stay raw
+        if len(hands) and self.filter_on:
+            hands = hands.copy()
+            view = hands.view(result_segment.HAND_DTYPE).reshape(-1)
+            self.filter.apply(view['landmarks'], view['label'], self.timestamp_ns)
+        elif not len(hands):
+            self.filter.reset()
+
+        self.results.write(self.frame_no, self.timestamp_ns, hands, flags)
+        if not flags & landmark_ring.RECORD_REUSED:
+            # Repeated landmarks are no observation of this frame: stamped with its time they would
+            # read as a still hand to the tracker and to interpolation over the history
+            self.tracker.update(self.tracker.tips_from_hands(hands.view(result_segment.HAND_DTYPE).reshape(-1)), self.timestamp_ns)
+            self.history.push(self.frame_no, self.timestamp_ns, hands, self.tracker.state(), flags)
+        if self.governor is not None:
+            # Only inferred results carry inference latency; tracked frames report themselves in track_gap()
+            if not flags:
+                self.governor.on_publish(self.timestamp_ns)
+            elif flags & landmark_ring.RECORD_REUSED:
+                self.governor.on_skip()
+            if self.governor.update(sum(self.ring.counts())):
+                self._apply_governor()
+
+    def merge(self, frame_no, timestamp_ns, hands, reused=False):
+        # Pool merger: publish results in frame order, drop any that arrive after a newer one
+        if frame_no <= self.frame_no:
+            self.stats['late'] += 1
+            return
+        
+        if self.frame_no:
+            self.stats['dropped'] += frame_no - self.frame_no - 1
+        self.frame_no = frame_no
+        self.timestamp_ns = timestamp_ns
+        self.stats['processed'] += 1
+        self.stats['skipped'] += reused
+        self.publish(hands, landmark_ring.RECORD_REUSED if reused else 0)
+
+    def inference_due(self):
+        # Governor stride: infer on every stride-th frame, and always right after a keystroke or lost flow
+        if self.governor is None or self.last_hands is None or self.detect_now:
+            return True
+        key_gen = self.control.generation(shm_control.CTRL_KEY)
+        if key_gen != self.stride_key_gen:
+            self.stride_key_gen = key_gen
+            return True
+        return self.frame_no - self.infer_frame_no >= self.governor.stride
+
+    def republish(self):
+        # Non-stride frame without flow tracking: repeat the last landmarks for this frame
+        self.stats['strided'] += 1
+        self.publish(self.last_hands, landmark_ring.RECORD_REUSED)
+
+    def find_hands(self, img):
+        hands = self.detect(img)
+        self.infer_frame_no = self.frame_no
+        self.detect_now = False
+        if self.flow is not None:
+            self._seed_flow(img, hands)
+        self.publish(hands, landmark_ring.RECORD_REUSED if self.reused else 0)
 
     def cleanup(self):
+        if self.executor:
+            self.executor.shutdown()
+            self.executor = None
+
+        if self.refine_executor:
+            self.refine_executor.shutdown()
+            self.refine_executor = None
+
+        if self.refine_ring:
+            self.refine_ring.close()
+            self.refine_ring = None
+
+        if self.bell:
+            self.bell.close()
+            self.bell = None
+
+        if self.ring:
+            self.print_stats()
+            self.ring.close()
+            self.ring = None
+
         if self.shm_frame:
             self.shm_frame.close()
             self.shm_frame = None
 
+        if self.results:
+            self.results.close()
+            self.results = None
+
         if self.shm_result:
             self.shm_result.close()
             try:
@@ -93,49 +542,146 @@ class HandDetector:
                 pass
             self.shm_result = None
 
-'''
-wait for version 2.0 update
+        if self.history:
+            self.history.close()
+            self.history = None
+
+        if self.shm_history:
+            self.shm_history.close()
+            try:
+                self.shm_history.unlink()
+            except:
+                pass
+            self.shm_history = None
 
-def fps_calibration():
+        if self.control:
+            self.control.close()
+            self.control = None
+
+        if self.shm_control:
+            self.shm_control.close()
+            if self.publish_results:
+                try:
+                    self.shm_control.unlink()
+                except:
+                    pass
+            self.shm_control = None
+
+def worker(index, conn, split=False):
+    # Pool worker: runs inference on the frame numbers the merger deals to it
     detector = None
-    img = None
-    elapsed = 0
     try:
-        detector = HandDetector()
-        while (img := detector.read_img()) is None:
-            time.sleep(0.01)
-
-        for _ in range (120):
-            while (img := detector.read_img()) is None:
-                time.sleep(0.01)
-            start = time.perf_counter()
-            detector.find_hands(img)
-            end = time.perf_counter()
-            elapsed += (end - start)
-        elapsed = elapsed / 120
-        fps = 1 // elapsed if elapsed > 0 else 0
-
-        return fps, elapsed
+        detector = HandDetector(publish=False, split=split)
+        conn.send(index)
+        while True:
+            if not conn.poll(shm_cfg.DOORBELL_TIMEOUT):
+                if detector.exit_requested():
+                    break
+                continue
+
+            frame_no = conn.recv()
+            while frame_no is not None and conn.poll():
+                frame_no = conn.recv()      # Only the newest assignment is worth running
+            if frame_no is None:
+                break
+
+            img = detector.read_img(frame_no)
+            if img is False:
+                break
+            if img is None:
+                continue
+            hands = detector.detect(img)
+            conn.send((detector.frame_no, detector.timestamp_ns, hands, detector.reused))
 
     except Exception as e:
-        return RuntimeError(f"Unexpected error occurred: {e}")
+        print(f"Error: Worker {index}: {e}")
     finally:
         if detector:
             detector.cleanup()
-'''
+
+def run_pool(workers, split=False):
+    merger = None
+    conns = []
+    procs = []
+    try:
+        merger = HandDetector(infer=False)
+        for i in range(workers):
+            parent_conn, child_conn = multiprocessing.Pipe()
+            proc = multiprocessing.Process(target=worker, args=(i, child_conn, split), daemon=True)
+            proc.start()
+            conns.append(parent_conn)
+            procs.append(proc)
+        for conn in conns:
+            print(f"Process: Detector worker {conn.recv()} ready.")
+
+        dispatched = merger.ring.latest()
+        last_stats = time.perf_counter()
+        while not merger.exit_requested():
+            for ready in connection.wait([merger.bell.sock] + conns, timeout=shm_cfg.DOORBELL_TIMEOUT):
+                if ready is merger.bell.sock:
+                    merger.bell.wait(0)
+                    latest = merger.ring.latest()
+                    for frame_no in range(max(dispatched + 1, latest - workers + 1), latest + 1):
+                        conns[frame_no % workers].send(frame_no)
+                    dispatched = latest
+                else:
+                    merger.merge(*ready.recv())
+            if merger.refine_requested():
+                merger.serve_refines()
+
+            if time.perf_counter() - last_stats > STATS_INTERVAL:
+                merger.print_stats()
+                last_stats = time.perf_counter()
+        print("Process: Received EXIT Flag.")
+
+    except Exception as e:
+        print(f"Error: {e}")
+    finally:
+        for conn in conns:
+            try:
+                conn.send(None)
+            except Exception:
+                pass
+        for proc in procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        if merger:
+            merger.cleanup()
+        print("Process: Hand Detector pool closed.")
 
 def main():
+    parser = argparse.ArgumentParser(description="YiTian Hand Detector")
+    parser.add_argument("--workers", type=int, default=shm_cfg.DETECTOR_WORKERS)
+    parser.add_argument("--split", action="store_true", default=shm_cfg.DETECTOR_SPLIT)
+    args = parser.parse_args()
+    if args.workers > 1:
+        run_pool(args.workers, args.split)
+        return
+
     detector = None
     try:
-        detector = HandDetector()
+        detector = HandDetector(split=args.split)
+        last_stats = time.perf_counter()
         while True:
+            if detector.refine_requested():
+                detector.serve_refines()
+            if detector.flow_active():
+                detector.track_gap()
             img = detector.read_img()
             if img is False:
                 break
             if img is None:
-                time.sleep(0.001)
+                detector.bell.wait()
                 continue
-            detector.find_hands(img)
+            if detector.inference_due():
+                detector.find_hands(img)
+            else:
+                detector.republish()
+
+            if time.perf_counter() - last_stats > STATS_INTERVAL:
+                detector.print_stats()
+                last_stats = time.perf_counter()
 
     except Exception as e:
         print(f"Error: {e}")
@@ -145,4 +691,5 @@ def main():
         print("Process: Hand Detector closed.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    multiprocessing.freeze_support()
+    main()
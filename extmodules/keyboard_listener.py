@@ -6,77 +6,120 @@ Copyright (c) 2025 Zhang Zhewei (Liyue-Wei)
 Licensed under the GNU GPL v3.0 License. 
 '''
 
-import threading
+import time
+from collections import deque, namedtuple
 from pynput import keyboard
 
+KeyEvent = namedtuple("KeyEvent", ["key", "timestamp_ns", "pressed", "repeat"])
+
 class KeyboardListener:
-    def __init__(self):
-        self.pressed_key = None
-        self.lock = threading.Lock()
-        self.listener = keyboard.Listener(on_press=self.on_press)
+    def __init__(self, maxlen=256):
+        # deque append/popleft are atomic, so the listener thread and the reader need no lock
+        self.events = deque(maxlen=maxlen)
+        self.held = set()
+        self.overflow = 0
+        self.listener = keyboard.Listener(on_press=self.on_press, on_release=self.on_release)
         self.listener.start()
 
+    def _key_name(self, key):
+        try:
+            if hasattr(key, 'char') and key.char:
+                return key.char.lower()
+            else:
+                match key:
+                    case keyboard.Key.space:
+                        return ' '
+                    case keyboard.Key.enter:
+                        return '\n'
+                    case keyboard.Key.tab:
+                        return '\t'
+                    case keyboard.Key.backspace:
+                        return "BACKSPACE"
+                    case keyboard.Key.esc:
+                        return "ESC"
+                    case keyboard.Key.enter:
+                        return "ENTER"
+                    case keyboard.Key.shift | keyboard.Key.shift_l | keyboard.Key.shift_r:
+                        return "SHIFT"
+                    case keyboard.Key.ctrl | keyboard.Key.ctrl_l | keyboard.Key.ctrl_r:
+                        return "CTRL"
+                    case keyboard.Key.alt | keyboard.Key.alt_l | keyboard.Key.alt_r | keyboard.Key.alt_gr:
+                        return "ALT"
+                    case keyboard.Key.caps_lock:
+                        return "CAPSLOCK"
+                    case keyboard.Key.cmd | keyboard.Key.cmd_l | keyboard.Key.cmd_r:
+                        return "CMD"
+                    case keyboard.Key.up:
+                        return "UP"
+                    case keyboard.Key.down:
+                        return "DOWN"
+                    case keyboard.Key.left:
+                        return "LEFT"
+                    case keyboard.Key.right:
+                        return "RIGHT"
+                    case keyboard.Key.delete:
+                        return "DELETE"
+                    case keyboard.Key.insert:
+                        return "INSERT"
+                    case keyboard.Key.home:
+                        return "HOME"
+                    case keyboard.Key.end:
+                        return "END"
+                    case keyboard.Key.page_up:
+                        return "PAGE_UP"
+                    case keyboard.Key.page_down:
+                        return "PAGE_DOWN"
+                    case _:
+                        return None    # "Invalid" if needed
+
+        except AttributeError:
+            print(f"[Warning] Invalid key attribute: {key}")
+            return None    # "Error" if needed
+
+    def _key_id(self, key):
+        # Physical key for `held`: a modifier pressed meanwhile changes the release's char
+        # ('a' -> '\x01' under Ctrl) but not its virtual key code
+        vk = getattr(key, 'vk', None)
+        return key if vk is None else vk
+
+    def _push(self, event):
+        if len(self.events) == self.events.maxlen:
+            self.overflow += 1
+        self.events.append(event)
+
     def on_press(self, key):
-        with self.lock:
-            try:
-                if hasattr(key, 'char') and key.char:
-                    self.pressed_key = key.char.lower()
-                else:
-                    match key:
-                        case keyboard.Key.space:
-                            self.pressed_key = ' '
-                        case keyboard.Key.enter:
-                            self.pressed_key = '\n'
-                        case keyboard.Key.tab:
-                            self.pressed_key = '\t'
-                        case keyboard.Key.backspace:
-                            self.pressed_key = "BACKSPACE"
-                        case keyboard.Key.esc:
-                            self.pressed_key = "ESC"
-                        case keyboard.Key.enter:
-                            self.pressed_key = "ENTER"
-                        case keyboard.Key.shift | keyboard.Key.shift_l | keyboard.Key.shift_r:
-                            self.pressed_key = "SHIFT"
-                        case keyboard.Key.ctrl | keyboard.Key.ctrl_l | keyboard.Key.ctrl_r:
-                            self.pressed_key = "CTRL"
-                        case keyboard.Key.alt | keyboard.Key.alt_l | keyboard.Key.alt_r | keyboard.Key.alt_gr:
-                            self.pressed_key = "ALT"
-                        case keyboard.Key.caps_lock:
-                            self.pressed_key = "CAPSLOCK"
-                        case keyboard.Key.cmd | keyboard.Key.cmd_l | keyboard.Key.cmd_r:
-                            self.pressed_key = "CMD"
-                        case keyboard.Key.up:
-                            self.pressed_key = "UP"
-                        case keyboard.Key.down:
-                            self.pressed_key = "DOWN"
-                        case keyboard.Key.left:
-                            self.pressed_key = "LEFT"
-                        case keyboard.Key.right:
-                            self.pressed_key = "RIGHT"
-                        case keyboard.Key.delete:
-                            self.pressed_key = "DELETE"
-                        case keyboard.Key.insert:
-                            self.pressed_key = "INSERT"
-                        case keyboard.Key.home:
-                            self.pressed_key = "HOME"
-                        case keyboard.Key.end:
-                            self.pressed_key = "END"
-                        case keyboard.Key.page_up:
-                            self.pressed_key = "PAGE_UP"
-                        case keyboard.Key.page_down:
-                            self.pressed_key = "PAGE_DOWN"
-                        case _:
-                            pass    # "Invalid" if needed
-
-            except AttributeError:
-                print(f"[Warning] Invalid key attribute: {key}")
-                pass    # "Error" if needed
+        timestamp_ns = time.perf_counter_ns()
+        name = self._key_name(key)
+        if name is None:
+            return
+        
+        key_id = self._key_id(key)
+        repeat = key_id in self.held
+        self.held.add(key_id)
+        self._push(KeyEvent(name, timestamp_ns, True, repeat))
+
+    def on_release(self, key):
+        timestamp_ns = time.perf_counter_ns()
+        self.held.discard(self._key_id(key))
+        name = self._key_name(key)
+        if name is None:
+            return
+        
+        self._push(KeyEvent(name, timestamp_ns, False, False))
+
+    def drain(self):
+        events = []
+        while self.events:
+            events.append(self.events.popleft())
+        return events
 
     def get_key(self):
-        with self.lock:
-            key = self.pressed_key
-            self.pressed_key = None
-            return key
+        # Single-key compatibility API: next press, releases are discarded
+        while self.events:
+            event = self.events.popleft()
+            if event.pressed:
+                return event.key
+        return None
         
     def stop_listener(self):
         if self.listener:
@@ -89,5 +132,8 @@ kbl = keyboard_listener.KeyboardListener()
 key = kbl.get_key()
 if key != None: print(key)
 
+for event in kbl.drain():
+    if event.pressed and not event.repeat: print(event.key, event.timestamp_ns)
+
 kbl.stop_listener()
 '''
\ No newline at end of file
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+'''
+YiTian - Landmark Ring Module
+
+Copyright (c) 2025 Zhang Zhewei (Liyue-Wei)
+Licensed under the GNU GPL v3.0 License. 
+'''
+
+import numpy as np
+try:
+    import shm_cfg
+    from result_segment import HAND_DTYPE
+except ModuleNotFoundError:
+    from extmodules import shm_cfg
+    from extmodules.result_segment import HAND_DTYPE
+
+# One record per inferred or flow-tracked frame
+RECORD_DTYPE = np.dtype([
+    ('seq', '<i8'),             # seqlock counter, odd while the record is being written
+    ('record_no', '<i8'),       # position in the stream, lets subscribers spot overwritten records
+    ('frame_no', '<i8'),
+    ('timestamp_ns', '<i8'),    # capture time of the source frame
+    ('count', '<i4'),
+    ('flags', '<i4'),           # RECORD_* bits
+    ('hands', HAND_DTYPE, (2,)),
+    ('tips', '<f4', (10, 4)),   # FingertipTracker state (x, y, vx, vy) at timestamp_ns, NaN if untracked
+])
+
+RECORD_REUSED = 1       # motion gate or stride skipped inference, hands repeat the previous result (result segment only)
+RECORD_TRACKED = 2      # no inference, fingertips moved by optical flow from the last one
+
+HEADER_SIZE = 64
+SEGMENT_SIZE = HEADER_SIZE + shm_cfg.HISTORY_LEN * RECORD_DTYPE.itemsize
+
+HDR_WRITTEN = 0         # number of records written so far
+
+SUB_LOSSLESS = 'lossless'   # every record in order, overruns counted when the writer laps the cursor
+SUB_LATEST = 'latest'       # only the newest record, older ones are skipped on purpose
+
+class LandmarkRing:
+    '''
+    Short history of timestamped landmark sets in shared memory.
+
+    The hand detector pushes one record per inferred or tracked frame;
+    readers take a snapshot of the whole ring and keep only records whose
+    sequence counter did not move during the copy, or follow the stream with
+    a Subscriber.
+    '''
+    def __init__(self, buf, length=shm_cfg.HISTORY_LEN):
+        self.length = length
+        self.header = np.ndarray((HEADER_SIZE // 8,), dtype=np.int64, buffer=buf)
+        self.records = np.ndarray((length,), dtype=RECORD_DTYPE, buffer=buf, offset=HEADER_SIZE)
+        self.seq = self.records['seq']
+
+    def push(self, frame_no, timestamp_ns, hands, tips=np.nan, flags=0):
+        written = int(self.header[HDR_WRITTEN])
+        idx = written % self.length
+        count = len(hands)
+
+        self.seq[idx] += 1
+        self.records['record_no'][idx] = written
+        self.records['frame_no'][idx] = frame_no
+        self.records['timestamp_ns'][idx] = timestamp_ns
+        self.records['count'][idx] = count
+        self.records['flags'][idx] = flags
+        self.records['hands'][idx, :count] = hands.view(HAND_DTYPE).reshape(-1)
+        self.records['tips'][idx] = tips
+        self.seq[idx] += 1
+        self.header[HDR_WRITTEN] = written + 1
+
+    def snapshot(self):
+        # Complete records sorted by capture time
+        before = self.seq.copy()
+        records = self.records.copy()
+        after = self.seq.copy()
+        valid = (before == after) & (before % 2 == 0) & (records['frame_no'] > 0)
+        records = records[valid]
+        return records[np.argsort(records['timestamp_ns'])]
+
+    def written(self):
+        return int(self.header[HDR_WRITTEN])
+
+    def subscribe(self, mode=SUB_LOSSLESS):
+        return Subscriber(self, mode)
+
+    def close(self):
+        self.header = None
+        self.records = None
+        self.seq = None
+
+class Subscriber:
+    '''
+    One consumer's read cursor over a LandmarkRing.
+
+    The cursor lives in the consumer, so the writer never waits for anyone
+    and any number of consumers (corrector, overlay, recorder) can follow
+    the stream at their own pace. A lossless subscriber that falls more than
+    a ring length behind loses the oldest records; they are counted in
+    `overruns` and the cursor jumps to the oldest record still held.
+    '''
+    def __init__(self, ring, mode=SUB_LOSSLESS):
+        if mode not in (SUB_LOSSLESS, SUB_LATEST):
+            raise ValueError(f"Unknown subscription mode: {mode}")
+        self.ring = ring
+        self.mode = mode
+        self.cursor = ring.written()     # next record number to read, new records only
+        self.received = 0
+        self.skipped = 0
+        self.overruns = 0
+
+    def poll(self):
+        # Records published since the last poll, oldest first (at most one for SUB_LATEST)
+        written = self.ring.written()
+        if written <= self.cursor:
+            return self.ring.records[:0].copy()
+
+        start = self.cursor
+        if self.mode == SUB_LATEST:
+            self.skipped += written - 1 - start
+            start = written - 1
+        elif written - start > self.ring.length:
+            self.overruns += written - self.ring.length - start
+            start = written - self.ring.length
+
+        numbers = np.arange(start, written)
+        idx = numbers % self.ring.length
+        before = self.ring.seq[idx]
+        records = self.ring.records[idx]
+        after = self.ring.seq[idx]
+        # Anything rewritten meanwhile belongs to a newer lap: the writer overran this cursor
+        valid = (before == after) & (before % 2 == 0) & (records['record_no'] == numbers)
+        self.overruns += int(np.count_nonzero(~valid))
+        self.cursor = written
+        self.received += int(np.count_nonzero(valid))
+        return records[valid]
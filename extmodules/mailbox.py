@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+'''
+YiTian - UI Mailbox Module
+
+Copyright (c) 2025 Zhang Zhewei (Liyue-Wei)
+Licensed under the GNU GPL v3.0 License.
+'''
+
+import numpy as np
+import time
+try:
+    import shm_cfg
+except ModuleNotFoundError:
+    from extmodules import shm_cfg
+
+# Slots (word offsets). Each slot starts with a seqlock word followed by its latest value.
+MB_FINGER = 0           # valid, x, y of the cursor fingertip in frame pixels
+MB_VERDICT = 8          # key (ord), fingering_corrector.VERDICTS index, key press timestamp_ns
+MB_KEY_MAP = 16         # key map version, the map itself travels on the control queue
+
+class Mailbox:
+    '''
+    Latest-value slots for high-rate UI state, main process -> camera / overlay.
+
+    Posting overwrites the slot instead of queueing, so a stalled reader never
+    builds a backlog and nothing is pickled. Each slot's sequence word is a
+    seqlock and doubles as its generation, so readers can tell new values.
+    '''
+    def __init__(self, buf):
+        self.words = np.ndarray((shm_cfg.MAILBOX_SIZE // 8,), dtype=np.int64, buffer=buf)
+        self.last = {}      # slot -> last consistent (seq, values)
+
+    def _post(self, slot, values):
+        self.words[slot] += 1
+        self.words[slot + 1 : slot + 1 + len(values)] = values
+        self.words[slot] += 1
+
+    def _peek(self, slot, count):
+        # Past SEQLOCK_TIMEOUT_NS of torn copies, the last consistent one, or the never-posted (zero) value
+        deadline = None
+        while True:
+            seq = int(self.words[slot])
+            if not seq & 1:
+                values = self.words[slot + 1 : slot + 1 + count].tolist()
+                if int(self.words[slot]) == seq:
+                    self.last[slot] = (seq, values)
+                    return seq, values
+            
+            if deadline is None:
+                deadline = time.perf_counter_ns() + shm_cfg.SEQLOCK_TIMEOUT_NS
+            elif time.perf_counter_ns() > deadline:
+                return self.last.get(slot, (0, [0] * count))
+
+    def generation(self, slot):
+        return int(self.words[slot])
+
+    def set_finger(self, pos):
+        self._post(MB_FINGER, (1, *pos) if pos else (0, 0, 0))
+
+    def get_finger(self):
+        seq, (valid, x, y) = self._peek(MB_FINGER, 3)
+        return seq, (x, y) if valid else None
+
+    def set_verdict(self, key, verdict, timestamp_ns):
+        self._post(MB_VERDICT, (ord(key[0]) if key else 0, verdict, timestamp_ns))
+
+    def get_verdict(self):
+        # (seq, key, verdict, timestamp_ns), key None before the first verdict
+        seq, (key, verdict, timestamp_ns) = self._peek(MB_VERDICT, 3)
+        return seq, chr(key) if key else None, verdict, timestamp_ns
+
+    def set_key_map_version(self, version):
+        self._post(MB_KEY_MAP, (version,))
+
+    def get_key_map_version(self):
+        return self._peek(MB_KEY_MAP, 1)[1][0]
+
+    def close(self):
+        self.words = None
+        self.last = {}
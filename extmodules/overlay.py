@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+'''
+YiTian - Overlay Layer Module
+
+Copyright (c) 2025 Zhang Zhewei (Liyue-Wei)
+Licensed under the GNU GPL v3.0 License.
+'''
+
+import cv2
+import numpy as np
+
+SPARSE_COVERAGE = 0.5   # blend only the covered pixels while they are less than this share of the box
+
+class OverlayLayer:
+    '''
+    Pre-rendered overlay composited over each frame with one blend.
+
+    `draw(canvas)` is ordinary BGR drawing code (putText, rectangles,
+    addWeighted panels). It only runs when the `key` passed to update()
+    changes, e.g. the key map version or the article position, and then twice:
+    on a black and on a white canvas. Their difference gives every pixel's
+    transparency per channel, so anti-aliased edges and translucent panels come
+    out exactly as if drawn on the frame. Each frame then blends just the
+    covered pixels of the bounding box instead of redrawing text.
+    '''
+    def __init__(self):
+        self.key = None
+        self.shape = None
+        self.box = None         # (x0, y0, x1, y1), None while the layer is empty
+        self.index = None       # covered pixels inside the box when sparse, else None
+        self.color = None       # uint8 layer over black, i.e. premultiplied colour
+        self.keep = None        # uint8 share of the frame that shows through, 255 = transparent
+
+    def update(self, shape, key, draw):
+        # Re-render when the frame size or key changed. Returns True if it did.
+        shape = tuple(shape[:2])
+        if key == self.key and shape == self.shape:
+            return False
+        self.key = key
+        self.shape = shape
+
+        black = np.zeros((*shape, 3), dtype=np.uint8)
+        white = np.full((*shape, 3), 255, dtype=np.uint8)
+        draw(black)
+        draw(white)
+        keep = white - black
+        ys, xs = np.nonzero((keep != 255).any(axis=2) | black.any(axis=2))
+        if len(xs) == 0:
+            self.box = None
+            return True
+
+        x0, y0, x1, y1 = int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1
+        self.box = (x0, y0, x1, y1)
+        self.color = black[y0:y1, x0:x1]
+        self.keep = keep[y0:y1, x0:x1]
+        if len(xs) < SPARSE_COVERAGE * (x1 - x0) * (y1 - y0):
+            self.index = (ys - y0, xs - x0)
+            self.color = self.color[self.index]
+            self.keep = self.keep[self.index]
+        else:
+            self.index = None
+        return True
+
+    def clear(self):
+        self.key = None
+        self.box = None
+
+    def composite(self, img):
+        # Blend the layer over img in place: frame * keep / 255 + layer colour
+        if self.box is None:
+            return img
+        x0, y0, x1, y1 = self.box
+        roi = img[y0:y1, x0:x1]
+        if self.index is None:
+            cv2.add(cv2.multiply(roi, self.keep, scale=1 / 255), self.color, dst=roi)
+        else:
+            roi[self.index] = cv2.add(cv2.multiply(roi[self.index], self.keep, scale=1 / 255), self.color)
+        return img
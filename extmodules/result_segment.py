@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+'''
+YiTian - Result Segment Module
+
+Copyright (c) 2025 Zhang Zhewei (Liyue-Wei)
+Licensed under the GNU GPL v3.0 License.
+'''
+
+import numpy as np
+import time
+try:
+    import shm_cfg
+except ModuleNotFoundError:
+    from extmodules import shm_cfg
+
+RESULT_MAGIC = int.from_bytes(b'YTRS', 'little')
+RESULT_VERSION = 1
+
+# One hand as published by the detector, label 1.0 = Left
+HAND_DTYPE = np.dtype([
+    ('label', '<f4'),
+    ('score', '<f4'),
+    ('landmarks', '<f4', (21, 3)),  # normalised x, y, z
+])
+HAND_FLOATS = HAND_DTYPE.itemsize // 4  # a hand as one row of a [hands, HAND_FLOATS] float32 array
+MAX_HANDS = 2
+
+HEADER_DTYPE = np.dtype([
+    ('magic', '<u4'),
+    ('version', '<u4'),
+    ('seq', '<i8'),             # seqlock counter, odd while the result is being written
+    ('result_no', '<i8'),       # results published so far, tells a fresh result from a stale one
+    ('frame_no', '<i8'),        # source frame in the frame ring
+    ('capture_ns', '<i8'),      # capture time of the source frame, time.perf_counter_ns()
+    ('finish_ns', '<i8'),       # time the result was published
+    ('count', '<i4'),
+    ('flags', '<i4'),           # landmark_ring.RECORD_* bits
+])
+
+SEGMENT_DTYPE = np.dtype([
+    ('header', HEADER_DTYPE),
+    ('hands', HAND_DTYPE, (MAX_HANDS,)),
+])
+SEGMENT_SIZE = SEGMENT_DTYPE.itemsize
+
+class ResultSegment:
+    '''
+    Latest landmark result, written by the hand detector and read by the main process.
+
+    The header's sequence word is a seqlock: the writer makes it odd while it
+    updates the record, and readers copy header and hands and retry until it
+    was even and unchanged, so they never see half-written hands.
+    '''
+    def __init__(self, buf, create=False):
+        record = np.ndarray((1,), dtype=SEGMENT_DTYPE, buffer=buf)
+        self.last = None        # last consistent (header, hands)
+        self.header = record['header']
+        self.hands = record['hands'][0]
+        if create:
+            record[0] = np.zeros((), dtype=SEGMENT_DTYPE)
+            self.header['magic'] = RESULT_MAGIC
+            self.header['version'] = RESULT_VERSION
+        elif self.header['magic'][0] != RESULT_MAGIC or self.header['version'][0] != RESULT_VERSION:
+            raise ValueError(f"Result segment version {int(self.header['version'][0])} unsupported, expected {RESULT_VERSION}")
+
+    def write(self, frame_no, capture_ns, hands, flags=0):
+        # hands: [count, HAND_FLOATS] float32 or HAND_DTYPE records
+        count = min(len(hands), MAX_HANDS)
+        self.header['seq'] += 1
+        self.hands[:count] = hands[:count].view(HAND_DTYPE).reshape(-1)
+        self.header['frame_no'] = frame_no
+        self.header['capture_ns'] = capture_ns
+        self.header['count'] = count
+        self.header['flags'] = flags
+        self.header['finish_ns'] = time.perf_counter_ns()
+        self.header['result_no'] += 1
+        self.header['seq'] += 1
+
+    def read(self):
+        # Consistent copy: (header record, hands[count] HAND_DTYPE). Past SEQLOCK_TIMEOUT_NS of torn
+        # copies the last consistent one, None if there is none yet
+        deadline = None
+        while True:
+            seq = int(self.header['seq'][0])
+            if not seq & 1:
+                header = self.header.copy()[0]
+                hands = self.hands[:min(int(header['count']), MAX_HANDS)].copy()
+                if int(self.header['seq'][0]) == seq:
+                    self.last = (header, hands)
+                    return self.last
+            
+            if deadline is None:
+                deadline = time.perf_counter_ns() + shm_cfg.SEQLOCK_TIMEOUT_NS
+            elif time.perf_counter_ns() > deadline:
+                return self.last
+
+    def close(self):
+        self.header = None
+        self.hands = None
+        self.last = None
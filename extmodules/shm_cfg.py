@@ -8,15 +8,107 @@ Licensed under the GNU GPL v3.0 License.
 
 SHM_FRAME_ID = "YiTian_SHM_Frame"
 SHM_RESULT_ID = "YiTian_SHM_RESULT"
+SHM_CONTROL_ID = "YiTian_SHM_CONTROL"
+SHM_HISTORY_ID = "YiTian_SHM_HISTORY"
+SHM_MAILBOX_ID = "YiTian_SHM_MAILBOX"
 
+# Requested camera mode; the negotiated one is published in the frame segment header
 WIDTH = 1920
 HEIGHT = 1080
 FPS = 60
 CHANNELS = 3
-FRAME_SIZE = WIDTH * HEIGHT * CHANNELS + 1
 
-RESULT_SIZE = 2048
+# Frame segment: [header | slot headers | slot frames], sized by frame_ring.segment_size()
+FRAME_SLOTS = 3
+FRAME_HEADER_SIZE = 128
+SLOT_HEADER_SIZE = 64
+FRAME_BYTES = WIDTH * HEIGHT * CHANNELS
+
+# Landmark history / stream: last HISTORY_LEN results with capture timestamps, see landmark_ring.py.
+# Also the slack a lossless subscriber has before it overruns (about 4 s at 60 fps)
+HISTORY_LEN = 256
+
+# Control segment: main process -> hand detector settings and the refinement queue, see shm_control.py
+CONTROL_SIZE = 16384
+
+# UI mailbox: latest finger position, verdict and key map version, main process -> camera, see mailbox.py.
+# Rare control messages (the key map itself) stay on a queue of at most UI_QUEUE_SIZE entries
+MAILBOX_SIZE = 256
+UI_QUEUE_SIZE = 4
+VERDICT_SHOW_NS = 1_000_000_000
+
+# Preview window, drawn by its own process from the newest published frame without acknowledging it
+PREVIEW_SCALE = 0.5
+PREVIEW_FPS = 30
+
+# Keyboard ROI published after calibration, margin counted in key pitches
+ROI_MARGIN_KEYS = 3
+ROI_SCALE = 1.0
+
+# Landmark smoothing inside the detector until the main process sets it: None, 'ema' or 'one_euro'
+FILTER_MODE = None
+
+# Consumer-acknowledged publishing: camera() skips decode and copy while FRAME_SLOTS - 1 published
+# frames are still unread, and writes anyway once FRAME_ACK_TIMEOUT_NS passed so a stalled reader recovers.
+# Off by default: the camera always overwrites the oldest slot, so readers get the newest capture and
+# read_at() / flow tracking see the frames in between; unread overwrites are counted by FrameRing.dropped().
+# Enable only when decode CPU matters more than latency, e.g. a single reader on a weak machine
+FRAME_ACK = False
+FRAME_ACK_TIMEOUT_NS = 500_000_000
+
+# Seqlock readers (control block, result segment, mailbox) retry a torn copy for at most this long, then
+# return their last good copy, so a writer that died or stalled mid-write can not hang them
+SEQLOCK_TIMEOUT_NS = 2_000_000
 
 FLAG_IDLE = 0
-FLAG_WRITING = 1
-FLAG_EXIT = 255
\ No newline at end of file
+FLAG_EXIT = 255
+
+# Frame doorbell (loopback UDP), rung by camera() after each published frame
+DOORBELL_PORT = 50621
+DOORBELL_TIMEOUT = 0.1
+
+# Hand detector processes, frames are dealt round-robin by frame number when > 1
+DETECTOR_WORKERS = 1
+
+# Split-frame mode: one single-hand graph per keyboard half once calibrated, halves overlap by SPLIT_OVERLAP_KEYS
+DETECTOR_SPLIT = False
+SPLIT_OVERLAP_KEYS = 1
+
+# Keystroke refinement: model_complexity=1 on a crop of REFINE_CROP_KEYS pitches around the pressed key,
+# in the held frame nearest the press, run on a detector thread of its own; frames further than
+# REFINE_MAX_SKEW_FRAMES frame periods from the press are not used. The frame ring keeps at least
+# REFINE_HISTORY_NS of frames (FRAME_SLOTS or more) so queued presses still find theirs
+REFINE_ON_KEY = True
+REFINE_CROP_KEYS = 4
+REFINE_MAX_SKEW_FRAMES = 1
+REFINE_HISTORY_NS = 150_000_000
+
+# Motion gate: skip inference and republish the last landmarks while fewer than MOTION_MIN_PIXELS
+# of the downsampled ROI changed by more than MOTION_PIXEL_DIFF grey levels; keystrokes always re-run.
+# Off by default: MOTION_MIN_PIXELS = 3 is a starting point, not a tuned value, and a still hand hovering
+# over a key can fall under it. Enable after tuning it against recorded footage (the 'skipped' count in
+# hand_detector's stats is the gated frames) so slow finger moves still pass
+MOTION_GATE = False
+MOTION_GATE_SIZE = (80, 45)
+MOTION_PIXEL_DIFF = 12
+MOTION_MIN_PIXELS = 3
+
+# Lucas-Kanade fingertip tracking on the frames between full inferences (single detector process);
+# a forward-backward error above FLOW_FB_MAX_PX loses a tip, confidence below FLOW_MIN_CONFIDENCE re-detects
+FLOW_TRACKING = True
+FLOW_WIN = 21
+FLOW_LEVELS = 3
+FLOW_FB_MAX_PX = 2.0
+FLOW_MIN_CONFIDENCE = 0.6
+
+# Inference governor (single detector process): levels of (model_complexity, input scale, inference stride)
+# from best to cheapest, stepped to hold GOVERNOR_TARGET_RATE landmark sets/s within GOVERNOR_LATENCY_NS.
+# No step up while machine CPU use (psutil) is above GOVERNOR_CPU_HIGH; without psutil the detector's own
+# CPU time in cores is compared instead
+GOVERNOR = True
+GOVERNOR_LEVELS = ((1, 1.0, 1), (0, 1.0, 1), (0, 0.75, 1), (0, 0.5, 1), (0, 0.5, 2), (0, 0.5, 3))
+GOVERNOR_START = 1
+GOVERNOR_TARGET_RATE = 30
+GOVERNOR_LATENCY_NS = 50_000_000
+GOVERNOR_INTERVAL_NS = 1_000_000_000
+GOVERNOR_CPU_HIGH = 0.8
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+'''
+YiTian - Control Block Module
+
+Copyright (c) 2025 Zhang Zhewei (Liyue-Wei)
+Licensed under the GNU GPL v3.0 License. 
+'''
+
+import numpy as np
+import time
+try:
+    import shm_cfg
+    import result_segment
+except ModuleNotFoundError:
+    from extmodules import shm_cfg
+    from extmodules import result_segment
+
+# Regions (word offsets). Each region starts with a seqlock word followed by its payload.
+CTRL_ROI = 0            # x0, y0, x1, y1 in frame pixels, empty box disables cropping
+CTRL_FILTER = 8         # mode, alpha, min_cutoff, beta, d_cutoff for the detector's LandmarkFilter
+CTRL_SPLIT = 16         # x, overlap in frame pixels and which side holds the left hand, x 0 disables splitting
+CTRL_REFINE = 24        # number of keystroke refinement requests written so far, see REFINE_REQUESTS
+CTRL_KEY = 168          # timestamp_ns of the latest keystroke, its generation forces the detector past the motion gate
+
+# Refinement queue, REFINE_QUEUE entries each, indexed by request id % REFINE_QUEUE and seqlocked per entry.
+# Request: seq, id, press timestamp_ns, x0, y0, x1, y1 crop in frame pixels.
+# Reply: seq, id, frame_no, timestamp_ns, count (-1 = not served), then count * HAND_FLOATS hand floats
+REFINE_QUEUE = 8
+REQUEST_WORDS = 8
+REPLY_WORDS = 8 + result_segment.MAX_HANDS * result_segment.HAND_FLOATS
+REFINE_REQUESTS = 176
+REFINE_REPLIES = REFINE_REQUESTS + REFINE_QUEUE * REQUEST_WORDS
+
+FILTER_MODES = (None, 'ema', 'one_euro')
+
+class ControlBlock:
+    '''
+    Settings published by the main process and polled by the hand detector.
+
+    Every region is guarded by its own sequence word, which doubles as a
+    generation counter so the reader can tell when a setting changed.
+    '''
+    def __init__(self, buf):
+        self.words = np.ndarray((shm_cfg.CONTROL_SIZE // 8,), dtype=np.int64, buffer=buf)
+        self.reals = np.ndarray((shm_cfg.CONTROL_SIZE // 8,), dtype=np.float64, buffer=buf)
+        self.last = {}      # region -> last consistent (seq, values)
+
+    def _write(self, region, values, view):
+        self.words[region] += 1
+        view[region + 1 : region + 1 + len(values)] = values
+        self.words[region] += 1
+
+    def _read(self, region, count, view):
+        # Past SEQLOCK_TIMEOUT_NS of torn copies, the last consistent one, or the never-written
+        # state (seq 0, zeros) that every getter already treats as unset
+        deadline = None
+        while True:
+            seq = int(self.words[region])
+            if not seq & 1:
+                values = view[region + 1 : region + 1 + count].copy()
+                if int(self.words[region]) == seq:
+                    self.last[region] = (seq, values)
+                    return seq, values
+            
+            if deadline is None:
+                deadline = time.perf_counter_ns() + shm_cfg.SEQLOCK_TIMEOUT_NS
+            elif time.perf_counter_ns() > deadline:
+                return self.last.get(region, (0, np.zeros(count, dtype=view.dtype)))
+
+    def generation(self, region):
+        return int(self.words[region])
+
+    def set_roi(self, box):
+        self._write(CTRL_ROI, box if box else (0, 0, 0, 0), self.words)
+
+    def get_roi(self):
+        seq, box = self._read(CTRL_ROI, 4, self.words)
+        x0, y0, x1, y1 = (int(v) for v in box)
+        if x1 <= x0 or y1 <= y0:
+            return seq, None
+        return seq, (x0, y0, x1, y1)
+
+    def set_filter(self, mode, alpha=0.5, min_cutoff=1.0, beta=10.0, d_cutoff=1.0):
+        self._write(CTRL_FILTER, (FILTER_MODES.index(mode), alpha, min_cutoff, beta, d_cutoff), self.reals)
+
+    def get_filter(self):
+        # None until the main process publishes settings, mode None means filtering is off
+        seq, values = self._read(CTRL_FILTER, 5, self.reals)
+        if seq == 0:
+            return seq, None
+        mode, alpha, min_cutoff, beta, d_cutoff = values.tolist()
+        return seq, {'mode': FILTER_MODES[int(mode)], 'alpha': alpha, 'min_cutoff': min_cutoff, 
+                     'beta': beta, 'd_cutoff': d_cutoff}
+
+    def set_split(self, x, overlap=0, left_first=True):
+        # left_first: the left hand is on the low-x side of the split
+        self._write(CTRL_SPLIT, (x, overlap, int(left_first)) if x else (0, 0, 0), self.words)
+
+    def get_split(self):
+        seq, values = self._read(CTRL_SPLIT, 3, self.words)
+        x, overlap, left_first = (int(v) for v in values)
+        if x <= 0:
+            return seq, None
+        return seq, (x, overlap, bool(left_first))
+
+    def notify_key(self, timestamp_ns):
+        self._write(CTRL_KEY, (timestamp_ns,), self.words)
+
+    def refine_count(self):
+        return int(self.words[CTRL_REFINE])
+
+    def set_refine(self, timestamp_ns, box):
+        # Queues a request and returns its id, echoed back by the detector in the reply
+        request = self.refine_count() + 1
+        entry = REFINE_REQUESTS + request % REFINE_QUEUE * REQUEST_WORDS
+        self._write(entry, (request, timestamp_ns, *box), self.words)
+        self.words[CTRL_REFINE] = request
+        return request
+
+    def get_refines(self, after=0):
+        # [(id, timestamp_ns, (x0, y0, x1, y1))] queued after request id `after`, oldest first;
+        # requests already overwritten by newer ones are left out
+        count = self.refine_count()
+        requests = []
+        for request in range(max(after, count - REFINE_QUEUE) + 1, count + 1):
+            entry = REFINE_REQUESTS + request % REFINE_QUEUE * REQUEST_WORDS
+            _, values = self._read(entry, 6, self.words)
+            found, timestamp_ns, x0, y0, x1, y1 = (int(v) for v in values)
+            if found == request:
+                requests.append((request, timestamp_ns, (x0, y0, x1, y1)))
+        return requests
+
+    def set_refined(self, request, frame_no, timestamp_ns, hands):
+        # hands None marks a request that could not be served (press frame already overwritten)
+        count = -1 if hands is None else len(hands)
+        entry = REFINE_REPLIES + request % REFINE_QUEUE * REPLY_WORDS
+        self.words[entry] += 1
+        self.words[entry + 1 : entry + 5] = (request, frame_no, timestamp_ns, count)
+        if count > 0:
+            self.reals[entry + 5 : entry + 5 + hands.size] = hands.ravel()
+        self.words[entry] += 1
+
+    def get_refined(self, request):
+        # (frame_no, timestamp_ns, hands[count, HAND_FLOATS] or None) for request, None while unanswered
+        # or while the reply stays torn past SEQLOCK_TIMEOUT_NS (the caller polls again)
+        entry = REFINE_REPLIES + request % REFINE_QUEUE * REPLY_WORDS
+        deadline = None
+        while True:
+            seq = int(self.words[entry])
+            if not seq & 1:
+                answered, frame_no, timestamp_ns, count = (int(v) for v in self.words[entry + 1 : entry + 5])
+                hands = None
+                if count >= 0:
+                    floats = result_segment.HAND_FLOATS
+                    hands = self.reals[entry + 5 : entry + 5 + count * floats].astype(np.float32).reshape(count, floats)
+                if int(self.words[entry]) == seq:
+                    if answered != request:
+                        return None
+                    return frame_no, timestamp_ns, hands
+            
+            if deadline is None:
+                deadline = time.perf_counter_ns() + shm_cfg.SEQLOCK_TIMEOUT_NS
+            elif time.perf_counter_ns() > deadline:
+                return None
+
+    def close(self):
+        self.words = None
+        self.reals = None
+        self.last = {}
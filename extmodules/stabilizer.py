@@ -6,37 +6,90 @@ Copyright (c) 2025 Zhang Zhewei (Liyue-Wei)
 Licensed under the GNU GPL v3.0 License. 
 '''
 
-import copy
+import numpy as np
+
+class LandmarkFilter:
+    '''
+    Landmark smoothing with the state held in float32 [hands, 21, 3] arrays.
+
+    mode 'ema' is the fixed alpha blend the Stabilizer always used. mode 'one_euro'
+    adapts the cutoff to landmark speed: steady fingers are smoothed hard, fast ones
+    follow with little lag. apply() filters in place, so it works on the shared
+    result array as well (FingeringCorrector.read_landmarks()['landmarks']).
+    '''
+    def __init__(self, mode='ema', alpha=0.5, min_cutoff=1.0, beta=10.0, d_cutoff=1.0, hands=2, fps=60):
+        self.configure(mode, alpha, min_cutoff, beta, d_cutoff)
+        self.dt_default = 1.0 / fps
+        self.prev = np.zeros((hands, 21, 3), dtype=np.float32)
+        self.prev_d = np.zeros((hands, 21, 3), dtype=np.float32)
+        self.prev_labels = None
+        self.prev_ns = None
+
+    def configure(self, mode='ema', alpha=0.5, min_cutoff=1.0, beta=10.0, d_cutoff=1.0):
+        if mode not in ('ema', 'one_euro'):
+            raise ValueError(f"Unknown filter mode: {mode}")
+        self.mode = mode
+        self.alpha = alpha
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+
+    def reset(self):
+        self.prev_labels = None
+        self.prev_ns = None
+
+    @staticmethod
+    def _smoothing(dt, cutoff):
+        tau = 1.0 / (2 * np.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def apply(self, landmarks, labels=None, timestamp_ns=None):
+        n = len(landmarks)
+        labels = tuple(labels) if labels is not None else n
+        if n == 0 or labels != self.prev_labels:
+            # Hands appeared, vanished or swapped: restart from the raw values
+            self.prev[:n] = landmarks
+            self.prev_d[:n] = 0.0
+            self.prev_labels = labels if n else None
+            self.prev_ns = timestamp_ns
+            return landmarks
+
+        prev = self.prev[:n]
+        if self.mode == 'ema':
+            prev += self.alpha * (landmarks - prev)
+        else:
+            dt = self.dt_default
+            if timestamp_ns is not None and self.prev_ns is not None and timestamp_ns > self.prev_ns:
+                dt = (timestamp_ns - self.prev_ns) / 1e9
+            
+            prev_d = self.prev_d[:n]
+            prev_d += self._smoothing(dt, self.d_cutoff) * ((landmarks - prev) / dt - prev_d)
+            cutoff = self.min_cutoff + self.beta * np.abs(prev_d)
+            prev += self._smoothing(dt, cutoff) * (landmarks - prev)
+
+        self.prev_ns = timestamp_ns
+        landmarks[...] = prev
+        return landmarks
 
 class Stabilizer:
+    '''MediaPipe multi_hand_landmarks wrapper around LandmarkFilter('ema').'''
     def __init__(self, alpha=0.5):
         self.alpha = alpha
-        self.prev_landmarks = None
+        self.filter = LandmarkFilter('ema', alpha=alpha)
 
     def process(self, current_landmarks):
         if not current_landmarks:
-            self.prev_landmarks = None
+            self.filter.reset()
             return None
 
-        if self.prev_landmarks is None or len(self.prev_landmarks) != len(current_landmarks):
-            self.prev_landmarks = copy.deepcopy(current_landmarks)
-            return current_landmarks
-
         try:
-            for i in range(len(current_landmarks)):
-                hand = current_landmarks[i]
-                prev_hand = self.prev_landmarks[i]
-
-                for j in range(len(hand.landmark)):
-                    lm = hand.landmark[j]          
-                    prev_lm = prev_hand.landmark[j] 
-
-                    lm.x = self.alpha * lm.x + (1 - self.alpha) * prev_lm.x
-                    lm.y = self.alpha * lm.y + (1 - self.alpha) * prev_lm.y
-                    lm.z = self.alpha * lm.z + (1 - self.alpha) * prev_lm.z
+            arr = np.array([[[lm.x, lm.y, lm.z] for lm in hand.landmark] for hand in current_landmarks], dtype=np.float32)
+            self.filter.apply(arr)
 
-            self.prev_landmarks = copy.deepcopy(current_landmarks)
+            for hand, values in zip(current_landmarks, arr.tolist()):
+                for lm, (x, y, z) in zip(hand.landmark, values):
+                    lm.x, lm.y, lm.z = x, y, z
         except Exception as e:
             print(f"Error: Stabilization failed: {e}")
         
-        return current_landmarks
\ No newline at end of file
+        return current_landmarks
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+'''
+YiTian - Fingertip Tracker Module
+
+Copyright (c) 2025 Zhang Zhewei (Liyue-Wei)
+Licensed under the GNU GPL v3.0 License. 
+'''
+
+import numpy as np
+
+TIP_INDICES = (4, 8, 12, 16, 20)    # MediaPipe thumb, index, middle, ring, pinky tips
+TIPS = 2 * len(TIP_INDICES)         # slots 0-4 Left hand, 5-9 Right hand
+
+class FingertipTracker:
+    '''
+    Constant-velocity Kalman filter for all 10 fingertips at once.
+
+    Each fingertip axis is an independent [position, velocity] filter, so the whole
+    state is a handful of [10, 2] arrays updated in closed form. Coordinates are
+    normalised like the result segment, time is perf_counter_ns.
+    '''
+    def __init__(self, accel_noise=10.0, meas_noise=1e-6, lost_ns=200_000_000):
+        self.q = accel_noise
+        self.r = meas_noise
+        self.lost_ns = lost_ns
+        self.pos = np.zeros((TIPS, 2))
+        self.vel = np.zeros((TIPS, 2))
+        self.p00 = np.zeros((TIPS, 2))      # covariance [[p00, p01], [p01, p11]] per axis
+        self.p01 = np.zeros((TIPS, 2))
+        self.p11 = np.zeros((TIPS, 2))
+        self.seen_ns = np.zeros(TIPS, dtype=np.int64)
+        self.valid = np.zeros(TIPS, dtype=bool)
+        self.t_ns = None
+
+    def reset(self):
+        self.valid[:] = False
+        self.t_ns = None
+
+    def update(self, tips, timestamp_ns):
+        # tips: [10, 2] measured fingertips, NaN rows for fingers that were not detected
+        if self.t_ns is not None and timestamp_ns > self.t_ns:
+            dt = (timestamp_ns - self.t_ns) / 1e9
+            self.pos += self.vel * dt
+            self.p00 += 2 * dt * self.p01 + dt * dt * self.p11 + self.q * dt ** 3 / 3
+            self.p01 += dt * self.p11 + self.q * dt ** 2 / 2
+            self.p11 += self.q * dt
+        self.t_ns = timestamp_ns
+
+        seen = ~np.isnan(tips[:, 0])
+        fresh = seen & ~self.valid
+        self.pos[fresh] = tips[fresh]
+        self.vel[fresh] = 0.0
+        self.p00[fresh] = self.r
+        self.p01[fresh] = 0.0
+        self.p11[fresh] = 1.0
+
+        track = seen & self.valid
+        s = self.p00[track] + self.r
+        k0 = self.p00[track] / s
+        k1 = self.p01[track] / s
+        innov = tips[track] - self.pos[track]
+        self.pos[track] += k0 * innov
+        self.vel[track] += k1 * innov
+        self.p11[track] -= k1 * self.p01[track]
+        self.p00[track] *= 1 - k0
+        self.p01[track] *= 1 - k0
+
+        self.seen_ns[seen] = timestamp_ns
+        self.valid = seen | (self.valid & (timestamp_ns - self.seen_ns < self.lost_ns))
+
+    def predict_at(self, timestamp_ns):
+        # [10, 2] extrapolated positions, NaN for fingertips that are not tracked
+        if self.t_ns is None:
+            return np.full((TIPS, 2), np.nan)
+        out = self.pos + self.vel * ((timestamp_ns - self.t_ns) / 1e9)
+        out[~self.valid] = np.nan
+        return out
+
+    def state(self):
+        # [10, 4] x, y, vx, vy at self.t_ns, NaN for fingertips that are not tracked
+        out = np.hstack((self.pos, self.vel))
+        out[~self.valid] = np.nan
+        return out
+
+    @staticmethod
+    def tips_from_hands(hands):
+        # Structured hands (result_segment.HAND_DTYPE) -> [10, 2] tips by hand slot, label 1.0 = Left
+        tips = np.full((TIPS, 2), np.nan)
+        for hand in hands:
+            slot = 0 if hand['label'] == 1.0 else len(TIP_INDICES)
+            tips[slot : slot + len(TIP_INDICES)] = hand['landmarks'][TIP_INDICES, :2]
+        return tips